@@ -27,6 +27,17 @@ class Settings:
     openrouter_api_key: str = os.getenv("OPENROUTER_API_KEY", "")
     openrouter_base_url: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     deepseek_model: str = os.getenv("DEEPSEEK_MODEL", "deepseek/deepseek-chat")
+    # Agrupar análisis de varios videos concurrentes en una sola petición (1 = desactivado). Ahorra
+    # peticiones bajo carga, pero cada análisis espera hasta la ventana aunque llegue solo y un fallo
+    # del lote afecta a todos sus videos. El analizador es compartido por todo el servicio: con más de 1,
+    # transcripciones de peticiones (y usuarios) distintos van en el mismo prompt y el texto de uno puede
+    # influir en los highlights de otro. Activarlo solo si todas las peticiones son del mismo cliente
+    deepseek_batch_size: int = int(os.getenv("DEEPSEEK_BATCH_SIZE", "1"))
+    deepseek_batch_window_ms: int = int(os.getenv("DEEPSEEK_BATCH_WINDOW_MS", "200"))  # Ventana de espera para completar el lote
+    # Horas que se reutiliza en disco la respuesta de Deepseek para una misma transcripción (0 = sin caché)
+    deepseek_cache_ttl_hours: int = int(os.getenv("DEEPSEEK_CACHE_TTL_HOURS", "168"))
+    # Mínimo de palabras transcritas para consultar a Deepseek (videos casi sin voz van directo al respaldo)
+    min_transcription_words: int = int(os.getenv("MIN_TRANSCRIPTION_WORDS", "30"))
     
     # Video Analysis Configuration - Optimizado para viralidad
     analysis_segment_duration: int = int(os.getenv("ANALYSIS_SEGMENT_DURATION", "30"))  # Segmentos más cortos para precisión
@@ -75,5 +86,30 @@ class Settings:
     # Whisper configuration (lazy load control)
     whisper_model_name: str = os.getenv("WHISPER_MODEL_NAME", "base")
     whisper_load_on_start: bool = os.getenv("WHISPER_LOAD_ON_START", "false").lower() in ("1", "true", "yes")
+    # Backend de transcripción: "openai" (openai-whisper), "whispercpp" (whisper-parallel-cpu, C++ nativo),
+    # "faster" (faster-whisper con inferencia por lotes de todos los segmentos) o "auto" (faster si está
+    # instalado, si no openai). openai-whisper y PyTorch se instalan aparte con requirements-openai-whisper.txt
+    whisper_backend: str = os.getenv("WHISPER_BACKEND", "auto").lower()
+    # whisper.cpp ya paraleliza internamente con OpenMP: limitar segmentos simultáneos para no sobresuscribir la CPU
+    whispercpp_max_concurrency: int = int(os.getenv("WHISPERCPP_MAX_CONCURRENCY", "1"))
+    # Transcribir el audio completo en una sola pasada y repartirlo por tiempo entre los segmentos de análisis
+    whisper_full_file: bool = os.getenv("WHISPER_FULL_FILE", "false").lower() in ("1", "true", "yes")
+    # Transcripciones openai-whisper simultáneas (en hilos). El modelo compartido instala hooks de caché
+    # durante cada decodificación, así que por defecto se serializan; los hilos de torch se reparten entre ellas
+    max_concurrent_transcriptions: int = int(os.getenv("MAX_CONCURRENT_TRANSCRIPTIONS", "1"))
+    # Procesos dedicados a openai-whisper (0 = desactivado). Cada proceso carga su propia copia del modelo en RAM
+    whisper_process_workers: int = int(os.getenv("WHISPER_PROCESS_WORKERS", "0"))
+    # faster-whisper: dispositivo ("auto", "cuda", "cpu"), tipo de cómputo y segmentos por lote.
+    # Con "auto" se usa float16 en GPU e int8 en CPU
+    whisper_device: str = os.getenv("WHISPER_DEVICE", "auto")
+    whisper_compute_type: str = os.getenv("WHISPER_COMPUTE_TYPE", "auto")
+    whisper_batch_size: int = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+    # faster-whisper: decodificar solo los tramos con voz (VAD Silero) y silencio mínimo que separa dos tramos
+    whisper_vad_filter: bool = os.getenv("WHISPER_VAD_FILTER", "true").lower() in ("1", "true", "yes")
+    whisper_vad_min_silence_ms: int = int(os.getenv("WHISPER_VAD_MIN_SILENCE_MS", "500"))
+    # Energía RMS por debajo de la cual un segmento se considera silencio y no se pasa a Whisper (0 = desactivado)
+    whisper_silence_rms: float = float(os.getenv("WHISPER_SILENCE_RMS", "0.003"))
+    # Procesos ffmpeg simultáneos al extraer el audio de todos los segmentos (0 = núcleos de la CPU)
+    ffmpeg_max_concurrency: int = int(os.getenv("FFMPEG_MAX_CONCURRENCY", "0"))
 
 settings = Settings()
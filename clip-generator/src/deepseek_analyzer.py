@@ -1,23 +1,285 @@
 import os
-import uuid
+import time
+import hashlib
+import functools
 import logging
 import asyncio
 import aiohttp
-import whisper
-import ffmpeg
-import subprocess
-import json
+import orjson
 import numpy as np
-import librosa
 import re
-from typing import List, Dict, Tuple, Any, Optional
+import bisect
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import wave
+from typing import List, Dict, Tuple, Any, Optional, AsyncIterator
 from dataclasses import dataclass
-from collections import defaultdict
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 from config import settings
 
+try:
+    import whisper_parallel_cpu  # Backend opcional basado en whisper.cpp
+except ImportError:
+    whisper_parallel_cpu = None
+
+try:
+    from numba import njit  # Compila los núcleos numéricos de selección (en requirements.txt)
+except ImportError:
+    def njit(*args, **kwargs):
+        """Sin Numba las funciones decoradas se ejecutan como Python normal"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+try:
+    import ahocorasick  # Opcional: búsqueda multi-patrón de palabras clave
+except ImportError:
+    ahocorasick = None
+
+try:
+    from faster_whisper import WhisperModel, BatchedInferencePipeline  # Backend opcional CTranslate2 por lotes
+    from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+except ImportError:
+    WhisperModel = None
+    BatchedInferencePipeline = None
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+
+@functools.lru_cache(maxsize=1)
+def _import_torch():
+    """Importa torch solo si se usa openai-whisper: con faster-whisper el proceso no paga su arranque ni su RAM"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+def _cuda_available() -> bool:
+    torch = _import_torch()
+    return torch is not None and torch.cuda.is_available()
+
+
+def _ctranslate2_cuda_available() -> bool:
+    """Detección de GPU para faster-whisper a través de CTranslate2, sin importar torch"""
+    try:
+        import ctranslate2
+    except ImportError:
+        return False
+    return ctranslate2.get_cuda_device_count() > 0
+
+
+def _load_openai_whisper(model_name: str):
+    """Importa openai-whisper solo al cargar el modelo: importar este módulo no paga su coste de arranque"""
+    import whisper
+    return whisper.load_model(model_name)
+
+# Whisper trabaja con audio mono a 16 kHz
+WHISPER_SAMPLE_RATE = 16000
+
+# Vallas de bloque de código Markdown alrededor de la respuesta JSON del modelo
+JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+
+# Primera cifra de la razón de un candidato ('duración: 12s'), usada como duración sugerida
+DURATION_HINT_RE = re.compile(r'(\b\d+(?:\.\d+)?)(?:s|sec|secs)?')
+
+# Estados HTTP de OpenRouter que merecen reintento (rate limit y errores transitorios del proveedor)
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+# Versión del prompt de highlights: incrementarla al cambiarlo invalida la caché de respuestas en disco
+PROMPT_VERSION = 1
+
+# Instrucciones fijas del análisis (mensaje system): el formato lo garantiza el modo JSON de la API
+HIGHLIGHTS_SYSTEM_PROMPT = (
+    "Eres un experto en contenido VIRAL para redes sociales. Selecciona TODOS los momentos con potencial "
+    "viral real (score >= 0.65): emociones intensas, frases memorables, momentos climáticos, valor único, "
+    "engagement natural o contenido que se querría compartir. Evita relleno, transiciones, explicaciones "
+    "largas sin gancho y momentos monótonos. Cada clip dura entre 15 s y 3 min ajustado al contenido, con "
+    "al menos 1 minuto de separación entre clips y sin límite fijo de clips. Los tiempos son absolutos del "
+    "video. Responde solo con un objeto JSON."
+)
+HIGHLIGHTS_SCHEMA = '{"highlights":[{"segment_index":int,"score":float,"reason":str,"start_time":float,"end_time":float}]}'
+BATCHED_HIGHLIGHTS_SCHEMA = '{"videos":[{"video":int,"highlights":[{"segment_index":int,"score":float,"reason":str,"start_time":float,"end_time":float}]}]}'
+# Partes fijas del mensaje de usuario, alrededor del bloque de transcripciones
+HIGHLIGHTS_PROMPT_PREFIX = "TRANSCRIPCIONES:\n"
+HIGHLIGHTS_PROMPT_SUFFIX = f"\n\nJSON: {HIGHLIGHTS_SCHEMA}"
+BATCHED_HIGHLIGHTS_PROMPT_SUFFIX = f"\n\nJSON: {BATCHED_HIGHLIGHTS_SCHEMA}"
+
+
+class OpenRouterAPIError(Exception):
+    """Respuesta no exitosa de la API de OpenRouter"""
+
+    def __init__(self, status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"OpenRouter respondió {status}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+def _is_retryable_error(exc: BaseException) -> bool:
+    """Reintentar fallos de red/timeout y estados 429/5xx; los 4xx restantes son definitivos"""
+    if isinstance(exc, OpenRouterAPIError):
+        return exc.retryable
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+_exponential_wait = wait_exponential(multiplier=1, max=10)
+
+
+def _wait_retry_after(retry_state) -> float:
+    """Respeta Retry-After cuando OpenRouter lo envía; si no, backoff exponencial"""
+    exc = retry_state.outcome.exception()
+    retry_after = getattr(exc, 'retry_after', None)
+    if retry_after is not None:
+        return retry_after
+    return _exponential_wait(retry_state)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Interpreta la cabecera Retry-After en segundos (se ignora el formato fecha HTTP)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, min(float(value), 60.0))
+    except ValueError:
+        return None
+
+
+# Modelos Whisper cargados en cada proceso del pool (uno por nombre de modelo)
+_worker_whisper_models: Dict[str, Any] = {}
+
+
+def _transcribe_worker(audio: np.ndarray, model_name: str) -> str:
+    """Transcribe audio PCM 16 kHz en un proceso del pool; el modelo se carga una vez por proceso"""
+    model = _worker_whisper_models.get(model_name)
+    if model is None:
+        torch = _import_torch()
+        if torch is not None:
+            torch.set_num_threads(1)  # un núcleo por proceso: el paralelismo lo da el pool
+        model = _load_openai_whisper(model_name)
+        _worker_whisper_models[model_name] = model
+    result = model.transcribe(audio, language='es', fp16=_cuda_available())
+    return result["text"].strip()
+
+
+class _JsonObjectTracker:
+    """Sigue incrementalmente el anidamiento de llaves de un texto JSON que llega por partes.
+
+    Permite saber cuándo se ha cerrado el primer objeto de nivel superior sin re-escanear
+    todo el buffer en cada fragmento (ignora las llaves dentro de cadenas).
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.closed = False
+        self._in_string = False
+        self._escape = False
+        # Caracteres consumidos hasta la llave de cierre del objeto raíz (incluida)
+        self.consumed = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Procesa un fragmento y devuelve True cuando el objeto raíz está completo"""
+        for ch in chunk:
+            if self.closed:
+                break
+            self.consumed += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                if self.started:
+                    self._in_string = True
+            elif ch == '{':
+                self.depth += 1
+                self.started = True
+            elif ch == '}' and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.closed = True
+        return self.closed
+
+
+# Pesos de base, emoción, claridad, flujo, energía y duración en el score avanzado
+ADVANCED_SCORE_WEIGHTS = np.array([0.30, 0.32, 0.05, 0.18, 0.05, 0.10])
+# Sin energía medida la claridad conserva su peso original y la energía no cuenta
+ADVANCED_SCORE_WEIGHTS_NO_ENERGY = np.array([0.30, 0.32, 0.10, 0.18, 0.0, 0.10])
+
+
+@njit(cache=True)
+def _wis_dp(scores: np.ndarray, predecessor: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Recurrencia OPT(i) = max(OPT(i-1), w_i + OPT(p_i)) sobre candidatos ordenados por fin.
+
+    dp[i + 1] es el mejor score con los i + 1 primeros candidatos y take[i] si el i-ésimo entra.
+    """
+    n = len(scores)
+    dp = np.zeros(n + 1)
+    take = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        with_current = scores[i] + dp[predecessor[i] + 1]
+        if with_current > dp[i]:
+            dp[i + 1] = with_current
+            take[i] = True
+        else:
+            dp[i + 1] = dp[i]
+    return dp, take
+
+
+@njit(cache=True)
+def _wis_dp_bounded(scores: np.ndarray, predecessor: np.ndarray, max_clips: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Recurrencia con el número de clips como segunda dimensión: OPT(i, k) = max(OPT(i-1, k), w_i + OPT(p_i, k-1)).
+
+    Cada fila se rellena con operaciones vectoriales, así que sin Numba sigue sin bucle escalar sobre k.
+    """
+    n = len(scores)
+    dp = np.zeros((n + 1, max_clips + 1))
+    take = np.zeros((n, max_clips + 1), dtype=np.bool_)
+    for i in range(n):
+        with_current = scores[i] + dp[predecessor[i] + 1, :-1]
+        better = with_current > dp[i, 1:]
+        take[i, 1:] = better
+        dp[i + 1, 1:] = np.where(better, with_current, dp[i, 1:])
+    return dp, take
+
+
+def _speech_clarity_array(words_per_second: np.ndarray, optimal_low: float, optimal_high: float) -> np.ndarray:
+    """Claridad según las palabras por segundo respecto al rango óptimo (0 para los candidatos sin palabras)"""
+    safe_wps = np.maximum(words_per_second, 1e-9)
+    clarity = np.where(words_per_second < optimal_low, words_per_second / optimal_low,
+                       np.where(words_per_second > optimal_high, optimal_high / safe_wps, 1.0))
+    return np.clip(np.where(words_per_second > 0, clarity, 0.0), 0.0, 1.0)
+
+
+def _advanced_scores(factors: np.ndarray, durations: np.ndarray, optimal_min: float,
+                     optimal_max: float, confidence: np.ndarray) -> np.ndarray:
+    """Score final avanzado de M candidatos: factores ponderados, optimalidad de duración y bonus por confianza.
+
+    `factors` es una matriz (M, 5) con base, emoción, claridad, flujo y energía (NaN si no se midió);
+    la combinación ponderada se resuelve con productos matriz-vector.
+    """
+    safe_durations = np.maximum(durations, 1e-9)
+    duration_score = np.where(durations < optimal_min, durations / optimal_min,
+                              np.where(durations > optimal_max, optimal_max / safe_durations, 1.0))
+    energy_measured = ~np.isnan(factors[:, 4])
+    weighted = np.column_stack((np.nan_to_num(factors), duration_score))
+    final_scores = np.where(energy_measured, weighted @ ADVANCED_SCORE_WEIGHTS,
+                            weighted @ ADVANCED_SCORE_WEIGHTS_NO_ENERGY)
+    final_scores *= 1.0 + confidence * 0.2
+    return np.minimum(final_scores, 1.0)
+
+
+@dataclass(slots=True)
 class ClipCandidate:
     """Estructura para candidatos de clips con metadatos avanzados"""
     start: float
@@ -33,6 +295,91 @@ class ClipCandidate:
     transcription: str
     confidence: float
 
+# Patrón formado solo por palabras literales: \b(palabra|otra palabra|...)\b
+_LITERAL_ALTERNATION_RE = re.compile(r'^\\b\(([^()\[\]{}.*+?^$\\]+)\)\\b$')
+_WORD_RE = re.compile(r'\w+')
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class _KeywordMatcher:
+    """Cuenta las coincidencias de cada patrón de una lista en una sola pasada por el texto.
+
+    Con pyahocorasick, las alternativas de palabras literales se buscan con un autómata
+    Aho-Corasick (comprobando los límites de palabra a mano) y solo los patrones con sintaxis
+    regex real ([!]{2,}, [?]...) pasan por una expresión combinada. Sin la librería, todos los
+    patrones van en una única alternancia con un grupo g<i> por patrón. En ambos casos las
+    coincidencias no se solapan y gana la más a la izquierda, como en re.finditer.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.size = len(patterns)
+        self._automaton = None
+        residual = list(enumerate(patterns))
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            residual = []
+            for i, pattern in enumerate(patterns):
+                literal = _LITERAL_ALTERNATION_RE.match(pattern)
+                if literal is None:
+                    residual.append((i, pattern))
+                    continue
+                for keyword in literal.group(1).split('|'):
+                    keyword = keyword.lower()
+                    automaton.add_word(keyword, (i, len(keyword)))
+            if len(automaton):
+                automaton.make_automaton()
+                self._automaton = automaton
+        self._residual = None
+        if residual:
+            self._residual = re.compile(
+                "|".join(f"(?P<g{i}>{pattern})" for i, pattern in residual),
+                re.IGNORECASE
+            )
+
+    def count(self, text: str, lower: Optional[str] = None) -> List[int]:
+        """`lower` es text.lower() si el llamador ya lo tiene, para no volver a calcularlo"""
+        counts = [0] * self.size
+        if self._automaton is not None:
+            if lower is None:
+                lower = text.lower()
+            hits = []
+            for end, (index, length) in self._automaton.iter(lower):
+                start = end - length + 1
+                # Equivalente a \b: descartar coincidencias dentro de otra palabra ("amor" en "amoral")
+                if start > 0 and _is_word_char(lower[start - 1]):
+                    continue
+                if end + 1 < len(lower) and _is_word_char(lower[end + 1]):
+                    continue
+                hits.append((start, -length, index))
+            hits.sort()
+            last_end = 0
+            for start, neg_length, index in hits:
+                if start < last_end:
+                    continue
+                counts[index] += 1
+                last_end = start - neg_length
+        if self._residual is not None:
+            for match in self._residual.finditer(text):
+                counts[int(match.lastgroup[1:])] += 1
+        return counts
+
+
+@dataclass
+class TextFeatures:
+    """Rasgos de una transcripción calculados una sola vez y compartidos por los análisis de texto"""
+    text: str
+    lower: str
+    words: List[str]
+    word_count: int
+
+    @classmethod
+    def from_text(cls, text: str) -> "TextFeatures":
+        words = text.split()
+        return cls(text=text, lower=text.lower(), words=words, word_count=len(words))
+
 class ViralContentDetector:
     """Detector avanzado de contenido viral con análisis semántico y temporal"""
     
@@ -100,6 +447,65 @@ class ViralContentDetector:
             r'\b(obvio|evidente|normal|típico)\b'
         ]
 
+        # Patrones de buen flujo conversacional
+        self.flow_patterns = [
+            r'\b(pero|sin embargo|aunque|además|también)\b',  # Conectores
+            r'\b(entonces|por eso|así que|por tanto)\b',  # Causa-efecto
+            r'\b(primero|segundo|después|finalmente)\b',  # Secuencia
+            r'\b(por ejemplo|es decir|o sea|vamos)\b',  # Explicación
+            r'[?]',  # Preguntas (engagement)
+            r'\b(mira|fíjate|imagínate|piensa)\b'  # Llamadas de atención
+        ]
+
+        # Todas las alternativas virales y anti-virales en un único matcher (índice = patrón):
+        # una sola pasada por el texto en lugar de un findall por patrón
+        alternatives = []
+        self.category_groups: Dict[str, List[int]] = {}
+        for category, config in self.viral_patterns.items():
+            self.category_groups[category] = []
+            for pattern in config['patterns']:
+                self.category_groups[category].append(len(alternatives))
+                alternatives.append(pattern)
+        # Vista vectorial de las categorías: los patrones de cada una son contiguos en el matcher
+        self.category_names = list(self.viral_patterns.keys())
+        self.category_offsets = np.array([groups[0] for groups in self.category_groups.values()])
+        self.category_sizes = np.array([len(groups) for groups in self.category_groups.values()])
+        self.category_weights = np.array([config['weight'] for config in self.viral_patterns.values()])
+        self.total_weight = float(self.category_weights.sum())
+        self.viral_group_count = len(alternatives)
+        self.anti_viral_groups = list(range(len(alternatives), len(alternatives) + len(self.anti_viral_patterns)))
+        alternatives.extend(self.anti_viral_patterns)
+        self.group_count = len(alternatives)
+        self.matcher = _KeywordMatcher(alternatives)
+        self.flow_matcher = _KeywordMatcher(self.flow_patterns)
+
+        # Prefiltro: primera palabra de cada alternativa viral literal y regex con los patrones que no
+        # lo son. Si el texto no contiene ninguna, ninguna categoría puede puntuar y se evita el matcher
+        literal_tokens = set()
+        residual = []
+        for config in self.viral_patterns.values():
+            for pattern in config['patterns']:
+                literal = _LITERAL_ALTERNATION_RE.match(pattern)
+                if literal is None:
+                    residual.append(pattern)
+                    continue
+                for keyword in literal.group(1).split('|'):
+                    literal_tokens.add(_WORD_RE.findall(keyword.lower())[0])
+        self.literal_tokens = frozenset(literal_tokens)
+        self._residual_viral = re.compile("|".join(residual), re.IGNORECASE) if residual else None
+
+    def may_be_viral(self, text: str, lower: Optional[str] = None) -> bool:
+        """False si el texto no puede coincidir con ningún patrón viral (comprobación O(palabras))"""
+        if lower is None:
+            lower = text.lower()
+        if not self.literal_tokens.isdisjoint(_WORD_RE.findall(lower)):
+            return True
+        return self._residual_viral is not None and self._residual_viral.search(text) is not None
+
+    def count_matches(self, text: str, lower: Optional[str] = None) -> List[int]:
+        """Número de coincidencias de cada patrón viral/anti-viral (índice = posición en el matcher)"""
+        return self.matcher.count(text, lower)
+
 class DeepseekVideoAnalyzer:
     """
     Analizador de video que usa Deepseek de OpenRouter para identificar 
@@ -129,59 +535,88 @@ class DeepseekVideoAnalyzer:
         self.absolute_max_duration = settings.absolute_max_clip_duration  # Máximo absoluto
 
         # Inicializar Whisper para transcripciones
-        # No cargar Whisper automáticamente: usar carga perezosa en _transcribe_segment
+        # Carga perezosa en _transcriber_ready salvo WHISPER_LOAD_ON_START (el modelo se comparte entre instancias)
         self.whisper_model = None
+        # Duraciones ya consultadas con ffprobe: (ruta real, tamaño, mtime) -> segundos
+        self._duration_cache: Dict[Tuple[str, int, float], float] = {}
+        self.whisper_backend = settings.whisper_backend
+        if self.whisper_backend == "auto":
+            # CTranslate2 con pesos int8 en CPU: más rápido y con menos memoria que el modelo PyTorch FP32
+            self.whisper_backend = "faster" if WhisperModel is not None else "openai"
+        if self.whisper_backend == "whispercpp" and whisper_parallel_cpu is None:
+            logger.warning("WHISPER_BACKEND=whispercpp pero whisper-parallel-cpu no está instalado, usando openai-whisper")
+            self.whisper_backend = "openai"
+        if self.whisper_backend == "faster" and WhisperModel is None:
+            logger.warning("WHISPER_BACKEND=faster pero faster-whisper no está instalado, usando openai-whisper")
+            self.whisper_backend = "openai"
+        # whisper.cpp usa todos los núcleos por sí mismo: acotar cuántos segmentos se transcriben a la vez
+        self._whispercpp_semaphore = asyncio.Semaphore(max(1, settings.whispercpp_max_concurrency))
+        # Whisper se ejecuta en hilos para no bloquear el event loop; repartir los núcleos entre ellos
+        self._transcription_semaphore = asyncio.Semaphore(max(1, settings.max_concurrent_transcriptions))
+        if self.whisper_backend == "openai":
+            torch = _import_torch()
+            if torch is not None:
+                torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, settings.max_concurrent_transcriptions)))
+        # Pool opcional de procesos para transcribir segmentos en paralelo sin el GIL
+        self._whisper_pool: Optional[ProcessPoolExecutor] = None
+        self._whisper_pool_workers = 0
+        if settings.whisper_process_workers > 0 and self.whisper_backend == "openai":
+            self._whisper_pool_workers = min(settings.whisper_process_workers, os.cpu_count() or 1)
+            self._whisper_pool = ProcessPoolExecutor(
+                max_workers=self._whisper_pool_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Transcripción Whisper en pool de {self._whisper_pool_workers} procesos")
+        if settings.whisper_load_on_start and self.whisper_backend == "openai" and self._whisper_pool is None:
+            self._ensure_whisper_model()
+        # Sesión HTTP reutilizada entre llamadas a OpenRouter (se crea con el primer uso)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Lotes de análisis para Deepseek (el worker se lanza con el primer uso)
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker_task: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
 
         os.makedirs(self.temp_dir, exist_ok=True)
 
-    def _analyze_viral_content(self, text: str) -> Dict[str, float]:
+    def _analyze_viral_content(self, features: TextFeatures) -> Dict[str, float]:
         """Análisis avanzado de contenido viral con puntuación detallada"""
+        text = features.text
         if not text:
             return {'score': 0.0, 'confidence': 0.0, 'category_scores': {}}
+
+        detector = self.viral_detector
+        if not detector.may_be_viral(text, features.lower):
+            # Relleno sin ningún término viral (intros, silencios, música): sin categorías el score es 0
+            # aunque haya términos anti-virales, así que no hace falta pasar el matcher completo
+            return {
+                'score': 0.0,
+                'confidence': 0.0,
+                'category_scores': {category: 0.0 for category in detector.viral_patterns},
+                'penalty': 0.0
+            }
         
-        text_lower = text.lower()
-        category_scores = {}
-        total_weight = 0
-        weighted_score = 0
-        
-        # Analizar cada categoría de contenido viral
-        for category, config in self.viral_detector.viral_patterns.items():
-            category_score = 0
-            matches = 0
-            
-            for pattern in config['patterns']:
-                pattern_matches = len(re.findall(pattern, text_lower))
-                if pattern_matches > 0:
-                    matches += pattern_matches
-                    category_score += pattern_matches
-            
-            # Normalizar score de categoría
-            if matches > 0:
-                # Bonus por diversidad de patrones en la categoría
-                pattern_diversity = len([p for p in config['patterns'] if re.search(p, text_lower)]) / len(config['patterns'])
-                category_score = min(category_score * (1 + pattern_diversity), 5.0)
-            
-            category_scores[category] = category_score
-            weighted_score += category_score * config['weight']
-            total_weight += config['weight']
-        
+        counts = np.array(detector.count_matches(text, features.lower))
+        viral_counts = counts[:detector.viral_group_count]
+
+        # Coincidencias por categoría y bonus por diversidad de patrones dentro de cada una
+        matches = np.add.reduceat(viral_counts, detector.category_offsets)
+        pattern_diversity = np.add.reduceat((viral_counts > 0).astype(np.int64), detector.category_offsets) / detector.category_sizes
+        category_vector = np.where(matches > 0, np.minimum(matches * (1 + pattern_diversity), 5.0), 0.0)
+
         # Aplicar penalizaciones por contenido anti-viral
-        penalty = 0
-        for anti_pattern in self.viral_detector.anti_viral_patterns:
-            penalty += len(re.findall(anti_pattern, text_lower)) * 0.3
-        
-        # Calcular score final
-        if total_weight > 0:
-            base_score = weighted_score / total_weight
-        else:
-            base_score = 0
-        
+        penalty = float(counts[detector.viral_group_count:].sum()) * 0.3
+
+        # Calcular score final (suma ponderada de categorías en un único producto escalar)
+        base_score = float(category_vector @ detector.category_weights) / detector.total_weight
         final_score = max(0, base_score - penalty)
-        
+
         # Calcular confianza basada en la cantidad de evidencia
-        total_matches = sum(category_scores.values())
+        total_matches = float(category_vector.sum())
         confidence = min(total_matches / 3.0, 1.0)  # Confianza máxima con 3+ matches
-        
+
+        # Diccionario solo en la frontera, para los metadatos
+        category_scores = dict(zip(detector.category_names, category_vector.tolist()))
+
         return {
             'score': final_score,
             'confidence': confidence,
@@ -189,34 +624,8 @@ class DeepseekVideoAnalyzer:
             'penalty': penalty
         }
 
-    def _analyze_speech_clarity(self, transcription: str, segment_duration: float) -> float:
-        """Analiza la claridad del discurso basada en la transcripción"""
-        if not transcription or segment_duration <= 0:
-            return 0.0
-        
-        words = transcription.split()
-        word_count = len(words)
-        
-        if word_count == 0:
-            return 0.0
-        
-        # Calcular palabras por segundo
-        words_per_second = word_count / segment_duration
-        
-        # Rango óptimo de palabras por segundo para claridad
-        optimal_wps_range = (2.0, 4.0)
-        
-        if optimal_wps_range[0] <= words_per_second <= optimal_wps_range[1]:
-            clarity_score = 1.0
-        elif words_per_second < optimal_wps_range[0]:
-            # Demasiado lento
-            clarity_score = words_per_second / optimal_wps_range[0]
-        else:
-            # Demasiado rápido
-            clarity_score = optimal_wps_range[1] / words_per_second
-        return float(max(0.0, min(1.0, clarity_score)))
-
-    def _compute_candidate_duration(self, candidate: ClipCandidate, video_duration: Optional[float] = None) -> float:
+    def _compute_candidate_duration(self, candidate: ClipCandidate, video_duration: Optional[float] = None,
+                                    word_count: Optional[int] = None) -> float:
         """Calcula una duración objetivo para un candidato combinando:
         - Duración sugerida por Deepseek (si está en la razón o metadata)
         - Densidad de palabras (words/sec) para evitar clips demasiado largos o cortos
@@ -230,15 +639,15 @@ class DeepseekVideoAnalyzer:
         suggested = None
         try:
             # Buscar patrones tipo 'duración: 12s' o 'optimal_duration' si viene en metadata
-            m = re.search(r'(\b\d+(?:\.\d+)?)(?:s|sec|secs)?', candidate.reason or '')
+            m = DURATION_HINT_RE.search(candidate.reason or '')
             if m:
                 suggested = float(m.group(1))
         except Exception:
             suggested = None
 
         # Calcular words/sec a partir de la transcripción
-        words = (candidate.transcription or '').split()
-        word_count = max(0, len(words))
+        if word_count is None:
+            word_count = len((candidate.transcription or '').split())
         cand_duration_est = (candidate.end - candidate.start) if (candidate.end > candidate.start) else None
 
         words_per_second = None
@@ -269,85 +678,23 @@ class DeepseekVideoAnalyzer:
             target = min(target, video_duration)
 
         return float(target)
-        
-        # Bonus por diversidad de vocabulario
-        unique_words = len(set(word.lower() for word in words))
-        vocabulary_diversity = unique_words / word_count if word_count > 0 else 0
-        
-        # Ajustar por diversidad (máximo 20% de bonus)
-        final_score = min(clarity_score * (1 + vocabulary_diversity * 0.2), 1.0)
-        
-        return final_score
 
-    def _analyze_conversation_flow(self, transcription: str) -> float:
+    def _analyze_conversation_flow(self, features: TextFeatures) -> float:
         """Analiza el flujo conversacional para engagement"""
-        if not transcription:
+        if not features.text:
             return 0.0
         
-        text_lower = transcription.lower()
         flow_score = 0.0
         
-        # Patrones de buen flujo conversacional
-        flow_patterns = [
-            r'\b(pero|sin embargo|aunque|además|también)\b',  # Conectores
-            r'\b(entonces|por eso|así que|por tanto)\b',  # Causa-efecto
-            r'\b(primero|segundo|después|finalmente)\b',  # Secuencia
-            r'\b(por ejemplo|es decir|o sea|vamos)\b',  # Explicación
-            r'[?]',  # Preguntas (engagement)
-            r'\b(mira|fíjate|imagínate|piensa)\b'  # Llamadas de atención
-        ]
-        
-        pattern_count = 0
-        for pattern in flow_patterns:
-            matches = len(re.findall(pattern, text_lower))
-            pattern_count += matches
+        pattern_count = sum(self.viral_detector.flow_matcher.count(features.text, features.lower))
         
         # Normalizar por longitud del texto
-        words = len(transcription.split())
-        if words > 0:
-            flow_density = pattern_count / words
+        if features.word_count > 0:
+            flow_density = pattern_count / features.word_count
             flow_score = min(flow_density * 20, 1.0)  # Escalar apropiadamente
         
         return flow_score
 
-    def _calculate_advanced_score(self, clip_candidate: ClipCandidate) -> float:
-        """Calcula puntuación final avanzada con múltiples factores"""
-        
-        # Pesos para cada factor (ajustados para favorecer emoción y variedad)
-        weights = {
-            'base_score': 0.30,
-            'emotional_intensity': 0.32,
-            'speech_clarity': 0.10,
-            'conversation_flow': 0.18,
-            'duration_optimality': 0.10
-        }
-        
-        # Calcular optimalidad de duración
-        duration = clip_candidate.end - clip_candidate.start
-        optimal_min, optimal_max = self.optimal_clip_duration
-        
-        if optimal_min <= duration <= optimal_max:
-            duration_score = 1.0
-        elif duration < optimal_min:
-            duration_score = duration / optimal_min
-        else:
-            duration_score = optimal_max / duration
-        
-        # Combinar todos los factores
-        final_score = (
-            clip_candidate.base_score * weights['base_score'] +
-            clip_candidate.emotional_intensity * weights['emotional_intensity'] +
-            clip_candidate.speech_clarity * weights['speech_clarity'] +
-            clip_candidate.conversation_flow * weights['conversation_flow'] +
-            duration_score * weights['duration_optimality']
-        )
-        
-        # Aplicar bonus por confianza alta
-        confidence_bonus = 1.0 + (clip_candidate.confidence * 0.2)
-        final_score *= confidence_bonus
-        
-        return min(final_score, 1.0)
-
     async def analyze_video_highlights_with_metadata(self, video_path: str) -> List[Dict[str, Any]]:
         """
         Analiza todo el video para identificar los mejores momentos para clips.
@@ -359,6 +706,7 @@ class DeepseekVideoAnalyzer:
         Returns:
             Lista de diccionarios con start, end, score, reason
         """
+        duration: Optional[float] = None
         try:
             if not self.api_key:
                 logger.warning("API key de OpenRouter no configurada, usando análisis básico")
@@ -379,24 +727,11 @@ class DeepseekVideoAnalyzer:
             logger.info(f"Video dividido en {len(segments)} segmentos para análisis")
             
             # 3. Transcribir cada segmento
-            segment_transcriptions = []
-            for i, (start, end) in enumerate(segments):
-                logger.info(f"Transcribiendo segmento {i+1}/{len(segments)}: {start:.1f}s - {end:.1f}s")
-                transcription = await self._transcribe_segment(video_path, start, end)
-                if transcription:
-                    segment_transcriptions.append({
-                        'start': start,
-                        'end': end,
-                        'transcription': transcription,
-                        'segment_index': i
-                    })
-                    logger.info(f"Segmento {i+1} transcrito: {len(transcription)} caracteres")
-                else:
-                    logger.warning(f"No se pudo transcribir el segmento {i+1}")
+            segment_transcriptions = await self._transcribe_segments(video_path, segments)
             
             if not segment_transcriptions:
                 logger.warning("No se pudieron transcribir segmentos, usando análisis de respaldo")
-                return await self._fallback_analysis_with_metadata(video_path)
+                return await self._fallback_analysis_with_metadata(video_path, duration)
             
             logger.info(f"Total de segmentos transcritos: {len(segment_transcriptions)}")
             
@@ -405,7 +740,7 @@ class DeepseekVideoAnalyzer:
             
             if not highlights:
                 logger.warning("Deepseek no devolvió highlights, usando análisis de respaldo")
-                return await self._fallback_analysis_with_metadata(video_path)
+                return await self._fallback_analysis_with_metadata(video_path, duration)
             
             # 5. Convertir a clips válidos con metadatos
             valid_clips = self._convert_to_clips_with_metadata(highlights, duration)
@@ -417,7 +752,7 @@ class DeepseekVideoAnalyzer:
             logger.error(f"Error en análisis de video con metadatos: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return await self._fallback_analysis_with_metadata(video_path)
+            return await self._fallback_analysis_with_metadata(video_path, duration)
 
     async def analyze_video_highlights(self, video_path: str) -> List[Tuple[float, float]]:
         """
@@ -429,6 +764,7 @@ class DeepseekVideoAnalyzer:
         Returns:
             Lista de tuplas (start_time, end_time) con los mejores momentos
         """
+        duration: Optional[float] = None
         try:
             if not self.api_key:
                 logger.warning("API key de OpenRouter no configurada, usando análisis básico")
@@ -447,26 +783,17 @@ class DeepseekVideoAnalyzer:
             logger.info(f"Video dividido en {len(segments)} segmentos para análisis")
             
             # 3. Transcribir cada segmento
-            segment_transcriptions = []
-            for i, (start, end) in enumerate(segments):
-                logger.info(f"Transcribiendo segmento {i+1}/{len(segments)}: {start:.1f}s - {end:.1f}s")
-                transcription = await self._transcribe_segment(video_path, start, end)
-                if transcription:
-                    segment_transcriptions.append({
-                        'start': start,
-                        'end': end,
-                        'transcription': transcription,
-                        'segment_index': i
-                    })
-                    logger.info(f"Segmento {i+1} transcrito: {len(transcription)} caracteres")
-                else:
-                    logger.warning(f"No se pudo transcribir el segmento {i+1}")
+            segment_transcriptions = await self._transcribe_segments(video_path, segments)
 
             logger.info(f"Transcripciones totales recogidas: {len(segment_transcriptions)} de {len(segments)} segmentos")
             
             # 4. Analizar con Deepseek
             highlights = await self._analyze_with_deepseek(segment_transcriptions)
             
+            if not highlights:
+                logger.warning("Deepseek no devolvió highlights, usando análisis de respaldo")
+                return await self._fallback_analysis(video_path, duration)
+            
             # 5. Convertir a clips válidos y filtrar solapamientos
             valid_clips = self._convert_to_clips(highlights)
             
@@ -475,12 +802,341 @@ class DeepseekVideoAnalyzer:
             
         except Exception as e:
             logger.error(f"Error en análisis de video: {e}")
-            return await self._fallback_analysis(video_path)
+            return await self._fallback_analysis(video_path, duration)
     
+    async def _transcribe_segments(self, video_path: str, segments: List[Tuple[float, float]]) -> List[Dict]:
+        """Transcribe los segmentos de análisis y devuelve solo los que tienen texto"""
+        if settings.whisper_full_file:
+            full_transcription = await self._transcribe_full_video(video_path)
+            if full_transcription is not None:
+                whisper_segments, audio = full_transcription
+                energies = self._normalize_energies([
+                    self._rms(audio[int(start * WHISPER_SAMPLE_RATE):int(end * WHISPER_SAMPLE_RATE)])
+                    for start, end in segments
+                ])
+                return self._slice_transcription_by_time(whisper_segments, segments, energies)
+            logger.warning("Transcripción completa no disponible, transcribiendo por segmentos")
+
+        if self.whisper_backend == "faster":
+            batched = await self._transcribe_segments_batched(video_path, segments)
+            if batched is not None:
+                return batched
+            logger.warning("Inferencia por lotes no disponible, transcribiendo segmento a segmento")
+
+        if self._whisper_pool is not None:
+            # Con pool de procesos los segmentos se transcriben en paralelo (acotado para no acumular audio)
+            concurrency = self._whisper_pool_workers * 2
+            logger.info(f"Transcribiendo {len(segments)} segmentos en paralelo")
+        else:
+            if not self._transcriber_ready():
+                return []
+            # Cada backend ya acota sus llamadas simultáneas con su propio semáforo: lanzar solo esas
+            if self.whisper_backend == "whispercpp":
+                concurrency = settings.whispercpp_max_concurrency
+            else:
+                concurrency = settings.max_concurrent_transcriptions
+
+        # ffmpeg extrae el segmento siguiente mientras Whisper transcribe los anteriores. El semáforo
+        # limita las transcripciones en vuelo y con ello el audio decodificado que se mantiene en memoria.
+        limit = asyncio.Semaphore(max(1, concurrency))
+        energies: List[Optional[float]] = [None] * len(segments)
+        pending: Dict[int, asyncio.Task] = {}
+
+        async def transcribe_bounded(audio: np.ndarray) -> Optional[str]:
+            try:
+                return await self._transcribe_audio(audio)
+            finally:
+                if self.whisper_backend == "whispercpp":
+                    self._remove_scratch_audio()
+                limit.release()
+
+        try:
+            async for i, audio in self._iter_segment_audio(video_path, segments):
+                start, end = segments[i]
+                logger.info("Transcribiendo segmento %d/%d: %.1fs - %.1fs", i + 1, len(segments), start, end)
+                if audio is None:
+                    continue
+                energies[i] = self._rms(audio)
+                if energies[i] < settings.whisper_silence_rms:
+                    # Sin voz que transcribir: Whisper solo alucinaría texto sobre el silencio
+                    continue
+                await limit.acquire()
+                pending[i] = asyncio.create_task(transcribe_bounded(audio))
+            results = dict(zip(pending, await asyncio.gather(*pending.values())))
+        finally:
+            for task in pending.values():
+                task.cancel()
+        return self._collect_transcriptions(
+            segments,
+            [results.get(i) for i in range(len(segments))],
+            self._normalize_energies(energies)
+        )
+
+    async def _transcribe_segments_batched(self, video_path: str, segments: List[Tuple[float, float]]) -> Optional[List[Dict]]:
+        """Transcribe todos los segmentos en una única llamada por lotes de faster-whisper.
+
+        El audio de cada ventana se concatena en un solo array y sus tramos con voz se pasan como
+        clip_timestamps, de modo que el modelo decodifica `whisper_batch_size` trozos a la vez en lugar
+        de uno por llamada.
+        Devuelve None si el pipeline no puede cargarse (el llamador usa el camino por segmentos).
+        """
+        pipeline = self._get_batched_pipeline()
+        if pipeline is None:
+            return None
+
+        audios = []
+        offsets = []  # inicio (s) de cada ventana dentro del audio concatenado
+        position = 0  # en muestras
+        segment_audios = await self._extract_all(video_path, segments)
+        energies = self._normalize_energies([self._rms(audio) for audio in segment_audios])
+        for audio in segment_audios:
+            offsets.append(position / WHISPER_SAMPLE_RATE)
+            if audio is None or len(audio) == 0:
+                continue
+            audios.append(audio)
+            position += len(audio)
+
+        if not audios:
+            return []
+
+        def run_batched() -> List[Dict]:
+            # Tramos por ventana desplazados a la línea de tiempo concatenada: ninguno cruza dos ventanas
+            clips = []
+            window_start = 0
+            for audio in audios:
+                clips.extend(
+                    {"start": window_start + clip["start"], "end": window_start + clip["end"]}
+                    for clip in self._speech_clips(audio)
+                )
+                window_start += len(audio)
+            if not clips:
+                return []
+            result, _ = pipeline.transcribe(
+                np.concatenate(audios),
+                language='es',
+                batch_size=settings.whisper_batch_size,
+                clip_timestamps=clips,
+                vad_filter=False
+            )
+            return [{'start': seg.start, 'end': seg.end, 'text': seg.text} for seg in result]
+
+        try:
+            async with self._transcription_semaphore:
+                whisper_segments = await asyncio.to_thread(run_batched)
+        except Exception as e:
+            logger.error(f"Error en transcripción por lotes: {e}")
+            return None
+
+        # Devolver cada frase a su ventana según el punto medio en la línea de tiempo concatenada
+        texts: List[List[str]] = [[] for _ in segments]
+        for seg in whisper_segments:
+            window = bisect.bisect_right(offsets, (seg['start'] + seg['end']) / 2.0) - 1
+            texts[max(0, window)].append(seg['text'].strip())
+        logger.info(f"Transcripción por lotes: {len(whisper_segments)} frases en {len(segments)} segmentos")
+        return self._collect_transcriptions(segments, [" ".join(t).strip() for t in texts], energies)
+
+    async def _extract_all(self, video_path: str, segments: List[Tuple[float, float]]) -> List[Optional[np.ndarray]]:
+        """Extrae el audio de todos los segmentos (en orden de segmento).
+
+        Con ventanas densas basta una sola pasada de ffmpeg; con ventanas dispersas se lanzan
+        procesos concurrentes con seek independiente.
+        """
+        if self._use_single_pass(segments):
+            audios: List[Optional[np.ndarray]] = [None] * len(segments)
+            async for i, audio in self._stream_segments_audio(video_path, segments):
+                audios[i] = audio
+            return audios
+
+        limit = asyncio.Semaphore(settings.ffmpeg_max_concurrency or os.cpu_count() or 1)
+
+        async def extract_bounded(start: float, end: float) -> Optional[np.ndarray]:
+            async with limit:
+                return await self._extract_segment_audio(video_path, start, end)
+
+        return await asyncio.gather(*[extract_bounded(start, end) for start, end in segments])
+
+    @staticmethod
+    def _use_single_pass(segments: List[Tuple[float, float]]) -> bool:
+        """Una sola pasada compensa cuando las ventanas cubren al menos la mitad del tramo que abarcan"""
+        if len(segments) < 2:
+            return False
+        span = segments[-1][1] - segments[0][0]
+        covered = sum(end - start for start, end in segments)
+        return span > 0 and covered / span >= 0.5
+
+    async def _iter_segment_audio(self, video_path: str,
+                                  segments: List[Tuple[float, float]]) -> AsyncIterator[Tuple[int, Optional[np.ndarray]]]:
+        """Produce (índice, PCM) de cada segmento en orden, con una pasada de ffmpeg o un seek por segmento"""
+        if self._use_single_pass(segments):
+            async for item in self._stream_segments_audio(video_path, segments):
+                yield item
+            return
+        for i, (start, end) in enumerate(segments):
+            yield i, await self._extract_segment_audio(video_path, start, end)
+
+    async def _stream_segments_audio(self, video_path: str, segments: List[Tuple[float, float]],
+                                     timeout: float = 30) -> AsyncIterator[Tuple[int, Optional[np.ndarray]]]:
+        """Decodifica todas las ventanas con un único proceso ffmpeg y las corta por muestras.
+
+        El contenedor se abre y se recorre una sola vez de forma secuencial (en lugar de N procesos
+        con su propio seek); los huecos entre ventanas se leen y se descartan. Las ventanas deben
+        estar ordenadas y no solaparse.
+        """
+        first = segments[0][0]
+        last = segments[-1][1]
+        logger.info(f"Extrayendo audio de {len(segments)} segmentos en una pasada: {first:.1f}s - {last:.1f}s")
+        cmd = ['ffmpeg', '-loglevel', 'error', '-ss', str(first), '-t', str(last - first), '-i', video_path,
+               '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE), 'pipe:1']
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        # Drenar stderr en paralelo para que ffmpeg no se bloquee si escribe mucho
+        stderr_task = asyncio.create_task(proc.stderr.read())
+        position = 0  # bytes leídos de stdout
+        try:
+            for i, (start, end) in enumerate(segments):
+                begin = int(round((start - first) * WHISPER_SAMPLE_RATE)) * 2
+                stop = int(round((end - first) * WHISPER_SAMPLE_RATE)) * 2
+                if begin > position:
+                    try:
+                        await asyncio.wait_for(proc.stdout.readexactly(begin - position), timeout=timeout)
+                    except asyncio.IncompleteReadError as e:
+                        # El audio termina dentro del hueco: los bytes parciales no son de esta ventana
+                        position += len(e.partial)
+                        yield i, None
+                        continue
+                    except asyncio.TimeoutError:
+                        logger.error(f"FFmpeg timeout al extraer audio ({timeout}s)")
+                        break
+                    position = begin
+                try:
+                    raw = await asyncio.wait_for(proc.stdout.readexactly(stop - position), timeout=timeout)
+                except asyncio.IncompleteReadError as e:
+                    raw = e.partial  # el audio termina antes que la ventana
+                except asyncio.TimeoutError:
+                    logger.error(f"FFmpeg timeout al extraer audio ({timeout}s)")
+                    break
+                position += len(raw)
+                yield i, (np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0) if raw else None
+        finally:
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+            await proc.wait()
+            stderr = await stderr_task
+            if proc.returncode not in (0, -9) and stderr:
+                logger.error(f"FFmpeg error extrayendo audio: {proc.returncode} - {stderr.decode(errors='ignore')}")
+
+    def _get_batched_pipeline(self):
+        """Pipeline por lotes de faster-whisper compartido entre instancias, o None si falla la carga"""
+        device = settings.whisper_device
+        if device == "auto":
+            device = "cuda" if _ctranslate2_cuda_available() else "cpu"
+        compute_type = settings.whisper_compute_type
+        if compute_type == "auto":
+            # FP16 en GPU; en CPU la cuantización int8 duplica aproximadamente el rendimiento
+            compute_type = "float16" if device == "cuda" else "int8"
+        try:
+            return self._load_batched_pipeline(
+                getattr(settings, 'whisper_model_name', 'base'),
+                device,
+                compute_type
+            )
+        except Exception as e:
+            logger.error(f"Error cargando faster-whisper: {e}")
+            return None
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2)
+    def _load_batched_pipeline(model_name: str, device: str, compute_type: str):
+        logger.info(f"Cargando faster-whisper '{model_name}' ({device}, {compute_type}) con inferencia por lotes")
+        model = WhisperModel(model_name, device=device, compute_type=compute_type)
+        return BatchedInferencePipeline(model=model)
+
+    @staticmethod
+    def _speech_clips(audio: np.ndarray) -> List[Dict[str, int]]:
+        """Tramos (en muestras) a decodificar con faster-whisper, de 30 s como máximo.
+
+        Con WHISPER_VAD_FILTER solo los tramos con voz según Silero: el silencio no pasa por el
+        encoder y Whisper no alucina texto sobre él. Sin VAD, el audio completo en bloques de 30 s.
+        """
+        if settings.whisper_vad_filter:
+            vad_options = VadOptions(
+                max_speech_duration_s=30.0,
+                min_silence_duration_ms=settings.whisper_vad_min_silence_ms
+            )
+            speech = merge_segments(get_speech_timestamps(audio, vad_options), vad_options)
+            return [{"start": int(clip["start"]), "end": int(clip["end"])} for clip in speech]
+        step = 30 * WHISPER_SAMPLE_RATE
+        return [{"start": start, "end": min(start + step, len(audio))} for start in range(0, len(audio), step)]
+
+    def _collect_transcriptions(self, segments: List[Tuple[float, float]],
+                                transcriptions: List[Optional[str]],
+                                energies: Optional[List[Optional[float]]] = None) -> List[Dict]:
+        """Empareja cada segmento con su transcripción y descarta los que quedaron vacíos"""
+        segment_transcriptions = []
+        for i, ((start, end), transcription) in enumerate(zip(segments, transcriptions)):
+            if transcription:
+                segment_transcriptions.append(
+                    self._segment_transcription(start, end, transcription, i, energies[i] if energies else None)
+                )
+                logger.info("Segmento %d transcrito: %d caracteres", i + 1, len(transcription))
+            else:
+                logger.warning("No se pudo transcribir el segmento %d", i + 1)
+        return segment_transcriptions
+
+    def _segment_transcription(self, start: float, end: float, transcription: str, index: int,
+                               audio_energy: Optional[float]) -> Dict:
+        segment = {
+            'start': start,
+            'end': end,
+            'transcription': transcription,
+            'segment_index': index
+        }
+        if audio_energy is not None:
+            segment['audio_energy'] = audio_energy
+        return segment
+
+    @staticmethod
+    def _rms(audio: Optional[np.ndarray]) -> Optional[float]:
+        """Energía RMS del PCM ya decodificado (sin segunda decodificación ni STFT)"""
+        if audio is None or len(audio) == 0:
+            return None
+        return float(np.sqrt(np.mean(np.square(audio, dtype=np.float32))))
+
+    @staticmethod
+    def _normalize_energies(raw: List[Optional[float]]) -> List[Optional[float]]:
+        """Normaliza las energías al rango 0..1 respecto al segmento más enérgico del video"""
+        peak = max((value for value in raw if value), default=0.0)
+        if peak <= 0:
+            return [None] * len(raw)
+        return [value / peak if value is not None else None for value in raw]
+
+    def _slice_transcription_by_time(self, whisper_segments: List[Dict], segments: List[Tuple[float, float]],
+                                     energies: Optional[List[Optional[float]]] = None) -> List[Dict]:
+        """Reparte los segmentos con marca de tiempo de Whisper entre las ventanas de análisis.
+
+        Cada frase se asigna a la ventana que contiene su punto medio.
+        """
+        midpoints = [(seg['start'] + seg['end']) / 2.0 for seg in whisper_segments]
+        segment_transcriptions = []
+        for i, (start, end) in enumerate(segments):
+            lo = bisect.bisect_left(midpoints, start)
+            hi = bisect.bisect_left(midpoints, end)
+            transcription = " ".join(whisper_segments[j]['text'].strip() for j in range(lo, hi)).strip()
+            if transcription:
+                segment_transcriptions.append(
+                    self._segment_transcription(start, end, transcription, i, energies[i] if energies else None)
+                )
+        logger.info(f"Transcripción completa repartida en {len(segment_transcriptions)} de {len(segments)} segmentos")
+        return segment_transcriptions
+
     def _create_analysis_segments(self, duration: float) -> List[Tuple[float, float]]:
         """Crea segmentos para análisis del video completo"""
-        segments: List[Tuple[float, float]] = []
-
         # Si se fuerza cobertura completa, generamos segmentos contiguos hasta un tope seguro
         if getattr(settings, 'force_full_coverage', False):
             max_safe_segments = min(self.max_segments, 300)  # tope de seguridad
@@ -488,49 +1144,35 @@ class DeepseekVideoAnalyzer:
             if estimated_segments > max_safe_segments:
                 logger.warning(f"FORCE_FULL_COVERAGE activo pero el número de segmentos ({estimated_segments}) excede el tope seguro ({max_safe_segments}). Se usarán {max_safe_segments} segmentos distribuidos uniformemente.")
                 # distribuir max_safe_segments a lo largo del video
-                step = duration / max_safe_segments
-                for i in range(max_safe_segments):
-                    start = max(0.0, i * step)
-                    end = min(duration, start + self.segment_duration)
-                    if end - start >= 0.01:
-                        segments.append((start, end))
-                return segments
+                return self._distributed_windows(duration, max_safe_segments)
             # si está dentro del tope, hacer segmentos contiguos
-            current_time = 0.0
-            while current_time < duration and len(segments) < estimated_segments:
-                end_time = min(current_time + self.segment_duration, duration)
-                segments.append((current_time, end_time))
-                current_time += self.segment_duration
-            return segments
+            return self._contiguous_windows(duration, estimated_segments)
 
         # Comportamiento por defecto: si el video cabe en max_segments se hacen contiguos
         if duration <= self.segment_duration * self.max_segments:
-            current_time = 0.0
-            while current_time < duration and len(segments) < self.max_segments:
-                end_time = min(current_time + self.segment_duration, duration)
-                segments.append((current_time, end_time))
-                current_time += self.segment_duration
-            return segments
+            return self._contiguous_windows(duration, self.max_segments)
 
         # Si el video es mucho más largo que el número máximo de segmentos,
         # distribuimos `max_segments` ventanas a lo largo de todo el video para cubrir todas las partes.
-        total_slots = self.max_segments
-        step = duration / total_slots
-        for i in range(total_slots):
-            start = max(0.0, i * step)
-            end = min(duration, start + self.segment_duration)
-            if end - start < 0.01:
-                continue
-            segments.append((start, end))
+        return self._distributed_windows(duration, self.max_segments)
 
-        return segments
+    def _contiguous_windows(self, duration: float, limit: int) -> List[Tuple[float, float]]:
+        """Ventanas consecutivas de `segment_duration` desde el inicio (como máximo `limit`)"""
+        starts = np.arange(0.0, duration, self.segment_duration)[:limit]
+        ends = np.minimum(starts + self.segment_duration, duration)
+        return list(zip(starts.tolist(), ends.tolist()))
 
-    def _compute_backup_segment_duration(self, position: float, index: int, total: int, min_d: float, max_d: float) -> float:
-        """Calcula una duración inteligente para clips de respaldo.
+    def _distributed_windows(self, duration: float, slots: int) -> List[Tuple[float, float]]:
+        """`slots` ventanas repartidas uniformemente a lo largo del video"""
+        starts = np.arange(slots) * (duration / slots)
+        ends = np.minimum(starts + self.segment_duration, duration)
+        valid = (ends - starts) >= 0.01
+        return list(zip(starts[valid].tolist(), ends[valid].tolist()))
 
-        - `position`: posición relativa en el video (0..1)
-        - `index`: índice del clip (0..total-1)
-        - `total`: número total de clips
+    def _compute_backup_segment_durations(self, positions: np.ndarray, min_d: float, max_d: float) -> np.ndarray:
+        """Calcula de una vez las duraciones inteligentes de todos los clips de respaldo.
+
+        - `positions`: posición relativa en el video (0..1) de cada clip, en orden de índice
         - `min_d`, `max_d`: límites absolutos
 
         La lógica busca:
@@ -539,44 +1181,36 @@ class DeepseekVideoAnalyzer:
         - Añadir una pequeña variación (jitter) dependiente del índice para evitar duraciones idénticas
         - Respetar `absolute_min_duration` y `absolute_max_duration`
         """
-        # Peso base según distancia al centro (0..1)
-        center_distance = abs(0.5 - position)
+        total = len(positions)
+        indices = np.arange(total)
 
-        # Más cerca del centro -> más largo. Invertir y normalizar.
-        center_influence = 1.0 - (center_distance * 2.0)  # 1 en centro, 0 en extremos
-        center_influence = max(0.0, min(1.0, center_influence))
+        # Más cerca del centro -> más largo: 1 en centro, 0 en extremos
+        center_influence = np.clip(1.0 - np.abs(0.5 - positions) * 2.0, 0.0, 1.0)
 
         # Base duration interpolada entre min_d y max_d
         base_duration = min_d + (max_d - min_d) * (0.2 + 0.8 * center_influence)
 
-        # Reducir levemente primer/último clip para gancho/cierre
-        edge_factor = 1.0
-        if index == 0 or index == total - 1:
-            edge_factor = 0.65
-        elif index == 1 or index == total - 2:
-            edge_factor = 0.85
+        # Reducir levemente primer/último clip para gancho/cierre (los extremos prevalecen)
+        edge_factor = np.ones(total)
+        edge_factor[(indices == 1) | (indices == total - 2)] = 0.85
+        edge_factor[(indices == 0) | (indices == total - 1)] = 0.65
 
-        duration = base_duration * edge_factor
+        durations = base_duration * edge_factor
 
-        # Añadir jitter determinístico pequeño basado en índice (para reproducibilidad)
-        jitter = (self._deterministic_jitter(index) - 0.5) * 0.15 * duration
-        duration += jitter
+        # Añadir jitter determinístico pequeño basado en índice (mismo LCG que _deterministic_jitter)
+        seeds = (indices + 1) * 9781
+        jitter_values = ((1664525 * seeds + 1013904223) & 0xFFFFFFFF) / 4294967296.0
+        durations = durations + (jitter_values - 0.5) * 0.15 * durations
 
         # Respetar límites absolutos configurados
-        duration = max(duration, self.absolute_min_duration, min_d)
-        duration = min(duration, self.absolute_max_duration, max_d)
-
-        return float(duration)
+        durations = np.maximum(durations, max(self.absolute_min_duration, min_d))
+        return np.minimum(durations, min(self.absolute_max_duration, max_d))
 
     def _deterministic_jitter(self, index: int) -> float:
         """Genera un valor pseudoaleatorio determinístico 0..1 a partir del índice."""
-        # Simple LCG para reproducibilidad
-        a = 1664525
-        c = 1013904223
-        m = 2 ** 32
-        seed = (index + 1) * 9781
-        val = (a * seed + c) % m
-        return (val / m)
+        # Simple LCG para reproducibilidad: a * seed + c (mod 2^32) con seed = (index + 1) * 9781,
+        # en una sola expresión con máscara en lugar de módulo
+        return ((1664525 * 9781 * (index + 1) + 1013904223) & 0xFFFFFFFF) / 4294967296.0
 
     def _parse_time_to_seconds(self, value: Any) -> Optional[float]:
         """Parsea distintos formatos de tiempo a segundos.
@@ -614,319 +1248,642 @@ class DeepseekVideoAnalyzer:
         """
         if not text:
             return None
-        # Intento simple: buscar primer '{' y último '}'
-        start = text.find('{')
-        end = text.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            candidate = text[start:end+1]
-            return candidate
-
-        # Eliminar bloques de código Markdown y buscar de nuevo
-        cleaned = re.sub(r'```[\s\S]*?```', '', text)
-        cleaned = cleaned.strip()
+        # Quitar las vallas de Markdown (```json ... ```) que suelen envolver la respuesta
+        cleaned = JSON_FENCE_RE.sub('', text.strip())
         start = cleaned.find('{')
+        if start == -1:
+            return None
+
+        # Emparejar llaves desde la primera '{' para ignorar texto (o llaves) posteriores al objeto
+        tracker = _JsonObjectTracker()
+        if tracker.feed(cleaned[start:]):
+            return cleaned[start:start + tracker.consumed]
+
+        # Objeto sin cerrar: devolver hasta la última '}' y dejar que el parser decida
         end = cleaned.rfind('}')
-        if start != -1 and end != -1 and end > start:
+        if end > start:
             return cleaned[start:end+1]
-
         return None
     
-    async def _transcribe_segment(self, video_path: str, start_time: float, end_time: float) -> Optional[str]:
-        """Transcribe un segmento específico del video"""
-        # Lazy-load modelo Whisper si está configurado para cargarse en inicio o si no está aún cargado
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _load_whisper(model_name: str):
+        """Carga un modelo Whisper una sola vez por proceso, compartido entre instancias del analizador"""
+        logger.info(f"Cargando modelo Whisper '{model_name}' para transcripción (lazy-load)")
+        model = _load_openai_whisper(model_name)
+        logger.info("Modelo Whisper cargado correctamente (lazy)")
+        return model
+
+    def _ensure_whisper_model(self) -> bool:
+        """Carga el modelo Whisper de forma perezosa. Devuelve True si está disponible."""
         if not self.whisper_model:
             try:
-                if settings.whisper_load_on_start or True:
-                    model_name = getattr(settings, 'whisper_model_name', 'base')
-                    logger.info(f"Cargando modelo Whisper '{model_name}' para transcripción (lazy-load)")
-                    self.whisper_model = whisper.load_model(model_name)
-                    logger.info("Modelo Whisper cargado correctamente (lazy)")
+                model_name = getattr(settings, 'whisper_model_name', 'base')
+                self.whisper_model = self._load_whisper(model_name)
             except Exception as e:
                 logger.error(f"Error cargando modelo Whisper: {e}")
                 self.whisper_model = None
         if not self.whisper_model:
             logger.warning("Modelo Whisper no disponible tras intento de carga")
+            return False
+        return True
+
+    async def _transcribe_full_video(self, video_path: str) -> Optional[Tuple[List[Dict], np.ndarray]]:
+        """Transcribe el audio completo del video en una sola llamada a Whisper.
+
+        Amortiza la carga del modelo, el espectrograma y el arranque de ffmpeg sobre todo el archivo.
+        Devuelve los segmentos con marca de tiempo ({start, end, text}) junto con el PCM decodificado
+        (para medir la energía sin volver a decodificar), o None si no es posible.
+        """
+        if self.whisper_backend == "whispercpp":
+            # whisper-parallel-cpu devuelve solo texto, sin marcas de tiempo para repartir
             return None
-        
+        pipeline = None
+        if self.whisper_backend == "faster":
+            pipeline = self._get_batched_pipeline()
+        if pipeline is None and not self._ensure_whisper_model():
+            return None
+
         try:
-            # Extraer audio del segmento
-            segment_id = str(uuid.uuid4())[:8]
-            audio_path = os.path.join(self.temp_dir, f"audio_segment_{segment_id}.wav")
-            
-            logger.info(f"Extrayendo audio del segmento {start_time:.1f}s - {end_time:.1f}s")
-            
-            # Usar ffmpeg para extraer el audio del segmento
-            try:
-                try:
-                    (
-                        ffmpeg
-                        .input(video_path, ss=start_time, t=end_time - start_time)
-                        .output(audio_path, acodec='pcm_s16le', ac=1, ar='16000')
-                        .overwrite_output()
-                        .run(quiet=True)
-                    )
-                except Exception as e:
-                    # Fallback robusto: intentar invocar ffmpeg directamente por subprocess
-                    logger.warning(f"ffmpeg-python falló ({e}), intentando fallback con subprocess")
-                    cmd = [
-                        'ffmpeg',
-                        '-y',
-                        '-ss', str(start_time),
-                        '-t', str(end_time - start_time),
-                        '-i', video_path,
-                        '-acodec', 'pcm_s16le',
-                        '-ac', '1',
-                        '-ar', '16000',
-                        audio_path
-                    ]
-                    try:
-                        completed = subprocess.run(cmd, check=True, capture_output=True, timeout=30)
-                        if completed.returncode != 0:
-                            logger.error(f"FFmpeg returned non-zero code: {completed.returncode} - {completed.stderr.decode(errors='ignore')}" )
-                    except subprocess.TimeoutExpired as te:
-                        logger.error(f"FFmpeg timeout al extraer segmento: {te}")
-                    except subprocess.CalledProcessError as ce:
-                        stderr = ce.stderr.decode(errors='ignore') if ce.stderr else str(ce)
-                        logger.error(f"FFmpeg error en subprocess: {stderr}")
-            except Exception as e:
-                logger.error(f"Error extrayendo audio del segmento: {e}")
+            logger.info(f"Extrayendo audio completo para transcripción única: {video_path}")
+            audio = await self._extract_audio(video_path, timeout=None)
+            if audio is None:
                 return None
-            
-            # Verificar que el archivo de audio se creó
-            if not os.path.exists(audio_path):
-                logger.error(f"Archivo de audio no se creó: {audio_path}")
-                return None
-            
-            # Transcribir con Whisper
-            try:
-                logger.info(f"Transcribiendo audio: {audio_path}")
-                result = self.whisper_model.transcribe(audio_path, language='es')  # Especificar español
+            if pipeline is not None:
+                whisper_segments = await self._run_batched_full(pipeline, audio)
+            else:
+                result = await self._run_whisper(audio)
+                whisper_segments = [
+                    {'start': float(seg['start']), 'end': float(seg['end']), 'text': seg['text']}
+                    for seg in result.get("segments", [])
+                ]
+            logger.info(f"Transcripción completa: {len(whisper_segments)} frases con marca de tiempo")
+            return whisper_segments, audio
+        except Exception as e:
+            logger.error(f"Error en transcripción completa del video: {e}")
+            return None
+
+    async def _run_batched_full(self, pipeline, audio: np.ndarray) -> List[Dict]:
+        """Transcribe el audio completo con faster-whisper: el VAD lo trocea en tramos de voz
+        que se decodifican por lotes, sin bucle de segmentos en Python"""
+        def run() -> List[Dict]:
+            clips = self._speech_clips(audio)
+            if not clips:
+                return []
+            result, _ = pipeline.transcribe(
+                audio,
+                language='es',
+                batch_size=settings.whisper_batch_size,
+                clip_timestamps=clips,
+                vad_filter=False
+            )
+            return [{'start': float(seg.start), 'end': float(seg.end), 'text': seg.text} for seg in result]
+
+        async with self._transcription_semaphore:
+            return await asyncio.to_thread(run)
+
+    async def _extract_audio(self, video_path: str, start_time: Optional[float] = None,
+                             duration: Optional[float] = None, timeout: Optional[float] = 30) -> Optional[np.ndarray]:
+        """Decodifica audio mono 16 kHz con un subproceso ffmpeg asíncrono y lo devuelve en memoria.
+
+        ffmpeg escribe PCM s16le por stdout, que se convierte a float32 [-1, 1] (el formato que
+        espera Whisper) sin pasar por un .wav temporal en disco.
+        """
+        cmd = ['ffmpeg', '-loglevel', 'error']
+        if start_time is not None:
+            cmd += ['-ss', str(start_time)]
+        if duration is not None:
+            cmd += ['-t', str(duration)]
+        cmd += ['-i', video_path, '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE), 'pipe:1']
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            raw, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.error(f"FFmpeg timeout al extraer audio ({timeout}s)")
+            return None
+
+        if proc.returncode != 0:
+            logger.error(f"FFmpeg error extrayendo audio: {proc.returncode} - {stderr.decode(errors='ignore')}")
+            return None
+        if not raw:
+            logger.error("FFmpeg no devolvió audio")
+            return None
+        return np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+
+    def _transcriber_ready(self) -> bool:
+        """Comprueba que el backend de transcripción puede usarse (carga el modelo si hace falta)"""
+        if self.whisper_backend == "whispercpp" or self._whisper_pool is not None:
+            return True
+        return self._ensure_whisper_model()
+
+    async def _extract_segment_audio(self, video_path: str, start_time: float, end_time: float) -> Optional[np.ndarray]:
+        """Extrae el PCM de un segmento (seek antes de -i: salto O(1) en lugar de decodificar hasta start)"""
+        try:
+            logger.info("Extrayendo audio del segmento %.1fs - %.1fs", start_time, end_time)
+            return await self._extract_audio(video_path, start_time, end_time - start_time)
+        except Exception as e:
+            logger.error(f"Error en transcripción de segmento: {e}")
+            return None
+
+    async def _transcribe_audio(self, audio: np.ndarray) -> Optional[str]:
+        """Transcribe audio PCM 16 kHz con el backend configurado"""
+        try:
+            if self.whisper_backend == "whispercpp":
+                transcription = await self._transcribe_with_whispercpp(audio)
+            elif self._whisper_pool is not None:
+                model_name = getattr(settings, 'whisper_model_name', 'base')
+                transcription = await asyncio.get_running_loop().run_in_executor(
+                    self._whisper_pool, _transcribe_worker, audio, model_name
+                )
+            else:
+                result = await self._run_whisper(audio)
                 transcription = result["text"].strip()
-                
-                # Limpiar archivo temporal
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-                
-                if transcription:
-                    logger.info(f"Transcripción exitosa: {len(transcription)} caracteres")
-                    return transcription
-                else:
-                    logger.warning("Transcripción vacía")
-                    return None
-                
-            except Exception as e:
-                logger.error(f"Error en transcripción: {e}")
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
+
+            if transcription:
+                logger.info("Transcripción exitosa: %d caracteres", len(transcription))
+                return transcription
+            else:
+                logger.warning("Transcripción vacía")
                 return None
-                
+
         except Exception as e:
-            logger.error(f"Error en transcripción de segmento: {e}")
+            logger.error(f"Error en transcripción: {e}")
             return None
+
+    async def _run_whisper(self, audio: np.ndarray) -> Dict[str, Any]:
+        """Ejecuta model.transcribe (CPU intensivo y bloqueante) en un hilo, fuera del event loop"""
+        async with self._transcription_semaphore:
+            # fp16 solo en GPU: en CPU openai-whisper lo descarta con un aviso en cada llamada
+            return await asyncio.to_thread(
+                self.whisper_model.transcribe, audio, language='es', fp16=_cuda_available()
+            )
+
+    def _scratch_audio_path(self) -> str:
+        """Ruta del .wav temporal de la tarea actual (una por proceso y tarea asyncio)"""
+        return os.path.join(self.temp_dir, f"audio_seg_{os.getpid()}_{id(asyncio.current_task())}.wav")
+
+    def _remove_scratch_audio(self):
+        try:
+            os.remove(self._scratch_audio_path())
+        except FileNotFoundError:
+            pass
+
+    async def _transcribe_with_whispercpp(self, audio: np.ndarray) -> str:
+        """Transcribe audio con whisper.cpp (C++ vectorizado, modelos ggml cuantizados).
+
+        whisper-parallel-cpu solo acepta rutas, así que el PCM se vuelca a un .wav temporal.
+        La llamada es bloqueante, así que se ejecuta en un hilo para no frenar el event loop.
+        """
+        model_name = getattr(settings, 'whisper_model_name', 'base')
+        # Un .wav por tarea asyncio; el llamador lo borra al terminar la transcripción del segmento
+        audio_path = self._scratch_audio_path()
+        with wave.open(audio_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(WHISPER_SAMPLE_RATE)
+            wav_file.writeframes((audio * 32768.0).clip(-32768, 32767).astype(np.int16).tobytes())
+        async with self._whispercpp_semaphore:
+            result = await asyncio.to_thread(whisper_parallel_cpu.transcribe_audio, audio_path, model_name)
+        if isinstance(result, dict):
+            result = result.get("text", "")
+        return (result or "").strip()
     
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Sesión HTTP compartida: reutiliza conexiones TLS y DNS hacia OpenRouter entre llamadas"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=600, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+        return self._session
+
+    async def close(self):
+        """Libera la sesión HTTP, el worker de lotes y el pool de procesos de Whisper"""
+        # Parar el worker y los lotes en curso antes de cerrar la sesión que usan, y fallar los
+        # análisis que siguen en cola para que sus llamadas no esperen indefinidamente
+        tasks = list(self._batch_tasks)
+        if self._batch_worker_task is not None:
+            tasks.append(self._batch_worker_task)
+            self._batch_worker_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._batch_queue is not None:
+            queued = []
+            while not self._batch_queue.empty():
+                queued.append(self._batch_queue.get_nowait())
+            self._fail_batch(queued, RuntimeError("Analizador cerrado antes de enviar el lote a Deepseek"))
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._whisper_pool is not None:
+            self._whisper_pool.shutdown(wait=False, cancel_futures=True)
+            self._whisper_pool = None
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=_wait_retry_after,
+        retry=retry_if_exception(_is_retryable_error),
+        reraise=True
+    )
+    async def _post_chat(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float = 60) -> str:
+        """POST a /chat/completions con reintentos; devuelve el contenido del primer mensaje.
+
+        La respuesta se pide en streaming (SSE): se acumulan los deltas y se corta la lectura en
+        cuanto el objeto JSON de la respuesta está cerrado, sin esperar al resto de la generación.
+        `timeout` (segundos) cubre la petición completa y debe crecer con la salida esperada.
+        """
+        payload = {**payload, "stream": True}
+        session = self._get_session()
+        async with session.post(
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            data=orjson.dumps(payload),
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                error = OpenRouterAPIError(
+                    response.status,
+                    error_text,
+                    retry_after=_parse_retry_after(response.headers.get("Retry-After"))
+                )
+                if error.retryable:
+                    logger.warning(f"OpenRouter respondió {response.status}, reintentando")
+                raise error
+            if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                # Proveedor sin soporte de streaming: respuesta JSON completa
+                result = orjson.loads(await response.read())
+                return result["choices"][0]["message"]["content"]
+            return await self._read_streamed_content(response)
+
+    async def _read_streamed_content(self, response: aiohttp.ClientResponse) -> str:
+        """Lee eventos SSE `data: {...}` y acumula `choices[0].delta.content`"""
+        tracker = _JsonObjectTracker()
+        parts: List[str] = []
+        buffer = b""
+        async for chunk, _ in response.content.iter_chunks():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for raw_line in lines:
+                line = raw_line.strip()
+                # Las líneas que empiezan por ':' son comentarios keep-alive de OpenRouter
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return "".join(parts)
+                event = orjson.loads(data)
+                if "error" in event:
+                    error = event["error"]
+                    code = error.get("code")
+                    raise OpenRouterAPIError(code if isinstance(code, int) else 502, str(error.get("message", error)))
+                choices = event.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    parts.append(delta)
+                    if tracker.feed(delta):
+                        logger.info("Objeto JSON de Deepseek completo, cortando el stream")
+                        return "".join(parts)
+        return "".join(parts)
+
+    def _normalize_transcription(self, text: str) -> str:
+        """Normaliza una transcripción para compararla (minúsculas y espacios colapsados)"""
+        return " ".join(text.lower().split())
+
+    def _format_transcriptions(self, segment_transcriptions: List[Dict]) -> str:
+        """Texto de transcripciones para el prompt, agrupando los segmentos con texto repetido.
+
+        Whisper suele producir el mismo texto en tramos de silencio o música; cada texto único se
+        envía una sola vez junto con todos los segmentos en los que aparece.
+        """
+        groups: Dict[str, List[Dict]] = {}
+        for seg in segment_transcriptions:
+            if seg['transcription']:
+                groups.setdefault(self._normalize_transcription(seg['transcription']), []).append(seg)
+
+        if len(groups) < len(segment_transcriptions):
+            logger.info(f"Transcripciones deduplicadas: {len(segment_transcriptions)} segmentos -> {len(groups)} textos únicos")
+        return "\n\n".join(self._transcription_block(segs) for segs in groups.values())
+
+    def _transcription_block(self, segs: List[Dict]) -> str:
+        """Bloque del prompt para un texto, con el índice y rango de cada segmento que lo contiene"""
+        first = segs[0]
+        if len(segs) == 1:
+            return f"Segmento {first['segment_index']} ({first['start']:.1f}s - {first['end']:.1f}s):\n{first['transcription']}"
+        indexes = ", ".join(str(seg['segment_index']) for seg in segs)
+        ranges = ", ".join(f"{seg['start']:.1f}s - {seg['end']:.1f}s" for seg in segs)
+        return f"Segmentos {indexes} ({ranges}) [mismo texto]:\n{first['transcription']}"
+
+    def _build_highlights_prompt(self, transcription_text: str) -> str:
+        """Mensaje de usuario para un video: transcripciones numeradas y esquema de respuesta"""
+        return "".join((HIGHLIGHTS_PROMPT_PREFIX, transcription_text, HIGHLIGHTS_PROMPT_SUFFIX))
+
+    def _build_batched_highlights_prompt(self, transcription_texts: List[str]) -> str:
+        """Mensaje de usuario que agrupa varios videos, etiquetados como VIDEO 1..N"""
+        videos_text = "\n\n".join(
+            f"=== VIDEO {n} ===\n{text}" for n, text in enumerate(transcription_texts, start=1)
+        )
+        return (
+            f"Analiza por separado cada uno de estos {len(transcription_texts)} videos; segment_index y tiempos "
+            f"se refieren solo a su propio video. Incluye una entrada por video aunque no tenga highlights.\n\n"
+            f"{HIGHLIGHTS_PROMPT_PREFIX}{videos_text}{BATCHED_HIGHLIGHTS_PROMPT_SUFFIX}"
+        )
+
+    def _openrouter_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/your-repo",
+            "X-Title": "Reelify IA Video Analyzer"
+        }
+
+    def _highlights_payload(self, prompt: str, max_tokens: int = 2000) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": HIGHLIGHTS_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3,
+            "max_tokens": max_tokens
+        }
+
+    async def _request_highlights(self, transcription_text: str) -> str:
+        """Obtiene la respuesta de Deepseek para un video, agrupándola con otros videos concurrentes"""
+        if settings.deepseek_batch_size <= 1:
+            payload = self._highlights_payload(self._build_highlights_prompt(transcription_text))
+            return await self._post_chat(self._openrouter_headers(), payload)
+
+        if self._batch_worker_task is None or self._batch_worker_task.done():
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker_task = asyncio.create_task(self._batch_worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((transcription_text, future))
+        return await future
+
+    async def _batch_worker(self):
+        """Reúne hasta `deepseek_batch_size` análisis llegados dentro de la ventana y los despacha juntos"""
+        loop = asyncio.get_running_loop()
+        window = settings.deepseek_batch_window_ms / 1000.0
+        while True:
+            batch = []
+            try:
+                batch.append(await self._batch_queue.get())
+                deadline = loop.time() + window
+                while len(batch) < settings.deepseek_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._batch_queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail_batch(batch, RuntimeError("Analizador cerrado antes de enviar el lote a Deepseek"))
+                raise
+            # Despachar en segundo plano para seguir recogiendo el siguiente lote mientras tanto
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _dispatch_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Envía un lote a Deepseek y resuelve el future de cada video con su parte de la respuesta"""
+        pending = [(text, future) for text, future in batch if not future.done()]
+        if not pending:
+            return
+        try:
+            if len(pending) == 1:
+                payload = self._highlights_payload(self._build_highlights_prompt(pending[0][0]))
+                contents = [await self._post_chat(self._openrouter_headers(), payload)]
+            else:
+                contents = await self._post_batched_highlights([text for text, _ in pending])
+        except asyncio.CancelledError:
+            self._fail_batch(pending, RuntimeError("Analizador cerrado durante la petición a Deepseek"))
+            raise
+        except Exception as e:
+            self._fail_batch(pending, e)
+            return
+        for (_, future), content in zip(pending, contents):
+            if not future.done():
+                future.set_result(content)
+
+    @staticmethod
+    def _fail_batch(batch: List[Tuple[str, asyncio.Future]], error: Exception):
+        """Propaga el error a los análisis del lote que aún esperan respuesta"""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _post_batched_highlights(self, transcription_texts: List[str]) -> List[str]:
+        """Una sola petición para varios videos; devuelve un JSON {"highlights": [...]} por video.
+
+        Si la respuesta combinada no se puede repartir, se repite la consulta video a video.
+        """
+        logger.info(f"Enviando lote de {len(transcription_texts)} videos a Deepseek en una sola petición")
+        headers = self._openrouter_headers()
+        payload = self._highlights_payload(
+            self._build_batched_highlights_prompt(transcription_texts),
+            max_tokens=2000 * len(transcription_texts)
+        )
+        # La salida crece con el número de videos: el timeout de un video se escala igual que max_tokens
+        content = await self._post_chat(headers, payload, timeout=60 * len(transcription_texts))
+        try:
+            json_text = self._extract_json_from_text(content)
+            if json_text is None:
+                raise ValueError('No JSON found')
+            videos = orjson.loads(json_text).get("videos")
+            if not isinstance(videos, list):
+                raise ValueError('Respuesta sin lista "videos"')
+            by_video = {
+                int(entry.get("video")): entry.get("highlights", [])
+                for entry in videos if isinstance(entry, dict) and entry.get("video") is not None
+            }
+        except (orjson.JSONDecodeError, ValueError, TypeError) as e:
+            logger.warning(f"No se pudo repartir la respuesta por lotes ({e}), analizando cada video por separado")
+            return await asyncio.gather(*[
+                self._post_chat(headers, self._highlights_payload(self._build_highlights_prompt(text)))
+                for text in transcription_texts
+            ])
+        return [
+            orjson.dumps({"highlights": by_video.get(n, [])}).decode()
+            for n in range(1, len(transcription_texts) + 1)
+        ]
+
+    def _highlights_cache_path(self, transcription_text: str) -> str:
+        """Ruta en caché de la respuesta para este prompt (modelo + versión del prompt + transcripciones)"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.model}\0{PROMPT_VERSION}\0".encode())
+        digest.update(transcription_text.encode())
+        return os.path.join(self.temp_dir, "deepseek_cache", f"{digest.hexdigest()}.json")
+
+    def _read_cached_highlights(self, cache_path: str) -> Optional[str]:
+        """Respuesta guardada si existe y no ha caducado"""
+        ttl_hours = settings.deepseek_cache_ttl_hours
+        if ttl_hours <= 0:
+            return None
+        try:
+            if time.time() - os.path.getmtime(cache_path) > ttl_hours * 3600:
+                return None
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_cached_highlights(self, cache_path: str, content: str) -> None:
+        """Guarda la respuesta (escritura atómica para que otra petición nunca lea un archivo a medias)"""
+        if settings.deepseek_cache_ttl_hours <= 0:
+            return
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la respuesta de Deepseek en caché: {e}")
+
     async def _analyze_with_deepseek(self, segment_transcriptions: List[Dict]) -> List[Dict]:
         """Analiza las transcripciones con Deepseek para identificar mejores momentos"""
         try:
+            # Sin contenido hablado suficiente (silencio, música) no merece la pena la llamada:
+            # devolver vacío hace que el llamador use el análisis de respaldo
+            total_words = sum(len(seg['transcription'].split()) for seg in segment_transcriptions)
+            if total_words < settings.min_transcription_words:
+                logger.warning(f"Transcripciones con solo {total_words} palabras, omitiendo análisis con Deepseek")
+                return []
+            distinct_texts = {self._normalize_transcription(seg['transcription']) for seg in segment_transcriptions}
+            if len(segment_transcriptions) > 1 and len(distinct_texts) == 1:
+                logger.warning("Todas las transcripciones son idénticas, omitiendo análisis con Deepseek")
+                return []
+
             # Preparar el prompt para Deepseek
-            transcription_text = "\n\n".join([
-                f"Segmento {seg['segment_index']} ({seg['start']:.1f}s - {seg['end']:.1f}s):\n{seg['transcription']}"
-                for seg in segment_transcriptions if seg['transcription']
-            ])
+            transcription_text = self._format_transcriptions(segment_transcriptions)
             
-            logger.info(f"Enviando {len(segment_transcriptions)} transcripciones a Deepseek para análisis")
-            
-            prompt = f"""Eres un experto en identificar contenido VIRAL en redes sociales. Analiza estas transcripciones y selecciona TODOS los momentos con potencial viral real.
-
-TRANSCRIPCIONES:
-{transcription_text}
-
-CRITERIOS VIRALES FLEXIBLES (Score mínimo 0.65):
-🔥 EMOCIONES INTENSAS: Reacciones auténticas, sorpresas, risas explosivas
-💬 FRASES MEMORABLES: Citas pegajosas, declaraciones polémicas apropiadas
-⚡ MOMENTOS CLIMÁTICOS: Puntos de tensión, revelaciones, plot twists
-🎯 VALOR ÚNICO: Información exclusiva, secretos, trucos desconocidos
-💡 ENGAGEMENT NATURAL: Preguntas directas, llamadas a la acción implícitas
-🔄 POTENCIAL SHARE: Contenido que la gente querría compartir inmediatamente
-
-EVITAR ABSOLUTAMENTE:
-❌ Explicaciones largas sin gancho emocional
-❌ Momentos de transición o relleno sin valor
-❌ Contenido técnico sin emoción
-❌ Repeticiones o información redundante
-❌ Momentos monótonos o de baja energía
-
-REGLAS TEMPORALES DINÁMICAS:
-- Duración COMPLETAMENTE FLEXIBLE: 15 segundos - 3 minutos según el contenido
-- Clips cortos (15-30s): Para momentos de máximo impacto, reacciones explosivas
-- Clips medianos (30-90s): Para historias completas, explicaciones valiosas
-- MÍNIMO 1 MINUTO de separación entre clips
-- SIN LÍMITE FIJO de clips - encuentra TODOS los momentos virales
-- La duración debe ajustarse PERFECTAMENTE al contenido
-- Priorizar CALIDAD y COMPLETITUD sobre restricciones arbitrarias
-
-DISTRIBUCIÓN INTELIGENTE:
-- Analiza TODO el video completo
-- Identifica CADA momento con potencial viral
-- No te limites a un número específico de clips
-- Distribuye clips a lo largo del video según el contenido
-- Si hay 10 momentos virales, devuelve 10 clips
-- Si hay 2 momentos virales, devuelve 2 clips
-
-INSTRUCCIONES ESPECÍFICAS:
-1. Lee TODA la transcripción antes de decidir
-2. Identifica TODOS los momentos que harían que alguien pause el scroll
-3. Ajusta la duración EXACTA necesaria para cada momento
-4. Incluye contexto suficiente para entender completamente el momento
-5. Los tiempos deben ser EXACTOS del video completo
-6. No te autolimites - encuentra todos los clips valiosos
-
-FORMATO DE RESPUESTA (JSON ESTRICTO):
-{{
-    "highlights": [
-        {{
-            "segment_index": 0,
-            "score": 0.85,
-            "reason": "Reacción explosiva inesperada que genera engagement inmediato",
-            "start_time": 125.5,
-            "end_time": 165.2,
-            "optimal_duration": 39.7,
-            "viral_category": "emotional_reaction",
-            "engagement_prediction": "high_share_potential",
-            "duration_rationale": "Duración ajustada para capturar toda la reacción y contexto"
-        }}
-    ]
-}}
-
-NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos virales, devuelve 8 clips. Si encuentras 15, devuelve 15. La duración debe ser la ÓPTIMA para cada momento específico."""
-            
-            # Hacer llamada a OpenRouter
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://github.com/your-repo",
-                "X-Title": "Reelify IA Video Analyzer"
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.3,
-                "max_tokens": 2000
-            }
+            cache_path = self._highlights_cache_path(transcription_text)
+            content = self._read_cached_highlights(cache_path)
+            cached = content is not None
+            if cached:
+                logger.info("Respuesta de Deepseek recuperada de caché para transcripciones idénticas")
+            else:
+                logger.info(f"Enviando {len(segment_transcriptions)} transcripciones a Deepseek para análisis")
+                try:
+                    content = await self._request_highlights(transcription_text)
+                except OpenRouterAPIError as e:
+                    logger.error(f"Error en API de OpenRouter: {e.status} - {e.body}")
+                    return []
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result["choices"][0]["message"]["content"]
-                        
-                        logger.info(f"Respuesta de Deepseek recibida: {content[:200]}...")
-
-                        # Parsear la respuesta JSON robustamente
-                        try:
-                            json_text = self._extract_json_from_text(content)
-                            if json_text is None:
-                                raise json.JSONDecodeError('No JSON found', content, 0)
-                            analysis_result = json.loads(json_text)
-                            highlights = analysis_result.get("highlights", [])
-
-                            logger.info(f"Deepseek parseó {len(highlights)} highlights candidatos")
-
-                            # Calcular duración aproximada del video a partir de segmentos (fallback)
-                            if segment_transcriptions:
-                                video_duration = max(seg.get('end', 0) for seg in segment_transcriptions)
+            logger.info(f"Respuesta de Deepseek recibida: {content[:200]}...")
+
+            # Parsear la respuesta JSON robustamente
+            try:
+                json_text = self._extract_json_from_text(content)
+                if json_text is None:
+                    raise ValueError('No JSON found')
+                analysis_result = orjson.loads(json_text)
+                highlights = analysis_result.get("highlights", [])
+                if not cached:
+                    self._write_cached_highlights(cache_path, content)
+
+                logger.info(f"Deepseek parseó {len(highlights)} highlights candidatos")
+
+                # Calcular duración aproximada del video a partir de segmentos (fallback)
+                if segment_transcriptions:
+                    video_duration = max(seg.get('end', 0) for seg in segment_transcriptions)
+                else:
+                    video_duration = 0.0
+
+                # Mapear índices de segmento a tiempos reales (los índices son los del prompt)
+                segments_by_index = {seg['segment_index']: seg for seg in segment_transcriptions}
+                mapped_highlights = []
+                for i, highlight in enumerate(highlights):
+                    segment_idx = highlight.get("segment_index", 0)
+                    segment = segments_by_index.get(segment_idx)
+                    if segment is not None:
+
+                        # Intentar parsear distintos formatos que pueda devolver Deepseek
+                        raw_start = highlight.get("start_time")
+                        raw_end = highlight.get("end_time")
+                        raw_duration = highlight.get("duration") or highlight.get("optimal_duration")
+
+                        parsed_start = self._parse_time_to_seconds(raw_start)
+                        parsed_end = self._parse_time_to_seconds(raw_end)
+                        parsed_duration = self._parse_time_to_seconds(raw_duration)
+
+                        # Si ambos tiempos están presentes y válidos, úsalos
+                        if parsed_start is not None and parsed_end is not None:
+                            final_start = parsed_start
+                            final_end = parsed_end
+                            logger.info("Highlight %d: Usando tiempos específicos de Deepseek: %.2fs - %.2fs", i + 1, final_start, final_end)
+                        else:
+                            # Si hay sólo duración, centrarla en el segmento
+                            if parsed_duration is not None:
+                                center_seg = (segment["start"] + segment["end"]) / 2
+                                final_start = center_seg - parsed_duration / 2
+                                final_end = center_seg + parsed_duration / 2
+                                logger.info("Highlight %d: Usando duration proporcionada: %.1fs -> %.2fs - %.2fs", i + 1, parsed_duration, final_start, final_end)
                             else:
-                                video_duration = 0.0
-
-                            # Mapear índices de segmento a tiempos reales
-                            mapped_highlights = []
-                            for i, highlight in enumerate(highlights):
-                                segment_idx = highlight.get("segment_index", 0)
-                                if segment_idx < len(segment_transcriptions):
-                                    segment = segment_transcriptions[segment_idx]
-
-                                    # Intentar parsear distintos formatos que pueda devolver Deepseek
-                                    raw_start = highlight.get("start_time")
-                                    raw_end = highlight.get("end_time")
-                                    raw_duration = highlight.get("duration") or highlight.get("optimal_duration")
-
-                                    parsed_start = self._parse_time_to_seconds(raw_start)
-                                    parsed_end = self._parse_time_to_seconds(raw_end)
-                                    parsed_duration = self._parse_time_to_seconds(raw_duration)
-
-                                    # Si ambos tiempos están presentes y válidos, úsalos
-                                    if parsed_start is not None and parsed_end is not None:
-                                        final_start = parsed_start
-                                        final_end = parsed_end
-                                        logger.info(f"Highlight {i+1}: Usando tiempos específicos de Deepseek: {final_start:.2f}s - {final_end:.2f}s")
-                                    else:
-                                        # Si hay sólo duración, centrarla en el segmento
-                                        if parsed_duration is not None:
-                                            center_seg = (segment["start"] + segment["end"]) / 2
-                                            final_start = center_seg - parsed_duration / 2
-                                            final_end = center_seg + parsed_duration / 2
-                                            logger.info(f"Highlight {i+1}: Usando duration proporcionada: {parsed_duration:.1f}s -> {final_start:.2f}s - {final_end:.2f}s")
-                                        else:
-                                            # Fallback al segmento completo, con intento de ajustar al texto (si Deepseek indica offsets relativos)
-                                            final_start = segment["start"]
-                                            final_end = segment["end"]
-                                            # Intento: si start_time es string tipo '00:01:23' relativo al segmento, convertir sumando
-                                            if isinstance(raw_start, str) and ":" in raw_start:
-                                                rel = self._parse_time_to_seconds(raw_start)
-                                                if rel is not None and rel < (segment["end"] - segment["start"]):
-                                                    final_start = segment["start"] + rel
-                                            if isinstance(raw_end, str) and ":" in raw_end:
-                                                rel = self._parse_time_to_seconds(raw_end)
-                                                if rel is not None and rel <= (segment["end"] - segment["start"]):
-                                                    final_end = segment["start"] + rel
-                                            logger.info(f"Highlight {i+1}: Usando tiempos del segmento como fallback: {final_start:.2f}s - {final_end:.2f}s")
-
-                                    # Clamp dentro del video
-                                    final_start = self._clamp(final_start, 0.0, video_duration)
-                                    final_end = self._clamp(final_end, 0.0, video_duration)
-
-                                    # Si end <= start, expandir ligeramente alrededor del segmento
-                                    if final_end <= final_start:
-                                        final_start = max(0.0, segment["start"]) 
-                                        final_end = min(video_duration, segment["end"]) 
-
-                                    # Asegurar duración mínima
-                                    if final_end - final_start < self.absolute_min_duration:
-                                        add = (self.absolute_min_duration - (final_end - final_start)) / 2
-                                        final_start = max(0.0, final_start - add)
-                                        final_end = min(video_duration, final_end + add)
-
-                                    mapped_highlights.append({
-                                        "start": float(final_start),
-                                        "end": float(final_end),
-                                        "score": float(highlight.get("score", 0.5)),
-                                        "reason": highlight.get("reason", "Momento destacado identificado por IA"),
-                                        "transcription": segment.get("transcription", "")
-                                    })
-
-                            # Filtrar clips solapados o muy cercanos
-                            filtered_highlights = self._filter_overlapping_clips(mapped_highlights)
-                            logger.info(f"Deepseek identificó {len(mapped_highlights)} highlights, filtrados a {len(filtered_highlights)} clips válidos")
-                            return filtered_highlights
-
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Error parseando respuesta de Deepseek: {e}")
-                            logger.error(f"Contenido recibido: {content}")
-                            return []
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Error en API de OpenRouter: {response.status} - {error_text}")
-                        return []
+                                # Fallback al segmento completo, con intento de ajustar al texto (si Deepseek indica offsets relativos)
+                                final_start = segment["start"]
+                                final_end = segment["end"]
+                                # Intento: si start_time es string tipo '00:01:23' relativo al segmento, convertir sumando
+                                if isinstance(raw_start, str) and ":" in raw_start:
+                                    rel = self._parse_time_to_seconds(raw_start)
+                                    if rel is not None and rel < (segment["end"] - segment["start"]):
+                                        final_start = segment["start"] + rel
+                                if isinstance(raw_end, str) and ":" in raw_end:
+                                    rel = self._parse_time_to_seconds(raw_end)
+                                    if rel is not None and rel <= (segment["end"] - segment["start"]):
+                                        final_end = segment["start"] + rel
+                                logger.info("Highlight %d: Usando tiempos del segmento como fallback: %.2fs - %.2fs", i + 1, final_start, final_end)
+
+                        # Clamp dentro del video
+                        final_start = self._clamp(final_start, 0.0, video_duration)
+                        final_end = self._clamp(final_end, 0.0, video_duration)
+
+                        # Si end <= start, expandir ligeramente alrededor del segmento
+                        if final_end <= final_start:
+                            final_start = max(0.0, segment["start"]) 
+                            final_end = min(video_duration, segment["end"]) 
+
+                        # Asegurar duración mínima
+                        if final_end - final_start < self.absolute_min_duration:
+                            add = (self.absolute_min_duration - (final_end - final_start)) / 2
+                            final_start = max(0.0, final_start - add)
+                            final_end = min(video_duration, final_end + add)
+
+                        mapped_highlights.append({
+                            "start": float(final_start),
+                            "end": float(final_end),
+                            "score": float(highlight.get("score", 0.5)),
+                            "reason": highlight.get("reason", "Momento destacado identificado por IA"),
+                            "transcription": segment.get("transcription", ""),
+                            "audio_energy": segment.get("audio_energy")
+                        })
+
+                # Filtrar clips solapados o muy cercanos
+                filtered_highlights = self._filter_overlapping_clips(mapped_highlights)
+                logger.info(f"Deepseek identificó {len(mapped_highlights)} highlights, filtrados a {len(filtered_highlights)} clips válidos")
+                return filtered_highlights
+
+            except (orjson.JSONDecodeError, ValueError) as e:
+                logger.error(f"Error parseando respuesta de Deepseek: {e}")
+                logger.error(f"Contenido recibido: {content}")
+                return []
         
         except Exception as e:
             logger.error(f"Error en análisis con Deepseek: {e}")
@@ -942,33 +1899,67 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         
         logger.info(f"Iniciando filtrado avanzado de {len(highlights)} clips candidatos")
         
+        # Rasgos de texto y arrays por highlight: las divisiones por duración se hacen de una vez
+        # Los highlights de un mismo segmento comparten transcripción: cada texto se analiza una sola vez
+        features_by_text: Dict[str, TextFeatures] = {}
+        text_analyses: Dict[str, Tuple[Dict[str, float], float]] = {}
+        highlight_features = []
+        for h in highlights:
+            text = h.get("transcription", "") or ""
+            if text not in features_by_text:
+                features_by_text[text] = TextFeatures.from_text(text)
+            highlight_features.append(features_by_text[text])
+        count = len(highlights)
+        starts = np.fromiter((float(h["start"]) for h in highlights), dtype=np.float64, count=count)
+        ends = np.fromiter((float(h["end"]) for h in highlights), dtype=np.float64, count=count)
+        word_counts = np.fromiter((f.word_count for f in highlight_features), dtype=np.int32, count=count)
+        durations = np.maximum(ends - starts, 0.01)
+        # Keyword density (palabras por segundo), también usada para la claridad del habla
+        keyword_densities = word_counts / durations
+        speech_clarities = _speech_clarity_array(keyword_densities, 2.0, 4.0)
+
+        # Factores por highlight (SoA): cada candidato, principal o variante, los toma por índice de origen
+        emotional_intensities = np.empty(count, dtype=np.float64)
+        conversation_flows = np.empty(count, dtype=np.float64)
+        audio_energies = np.empty(count, dtype=np.float64)
+        confidences = np.empty(count, dtype=np.float64)
+        candidate_sources: List[int] = []
+        candidate_base_scores: List[float] = []
+        candidate_starts: List[float] = []
+        candidate_ends: List[float] = []
+
         # Convertir a ClipCandidates con análisis completo y generar candidatos alternativos
         candidates: List[ClipCandidate] = []
-        for highlight in highlights:
-            start = float(highlight["start"])
-            end = float(highlight["end"])
-            transcription = highlight.get("transcription", "") or ""
+        for i, highlight in enumerate(highlights):
+            start = float(starts[i])
+            end = float(ends[i])
+            transcription = highlight_features[i].text
             base_score = float(highlight.get("score", 0.5))
-
-            # Análisis viral avanzado
-            viral_analysis = self._analyze_viral_content(transcription)
+            features = highlight_features[i]
+
+            # Análisis viral avanzado y de flujo conversacional (memorizados por texto)
+            analysis = text_analyses.get(transcription)
+            if analysis is None:
+                analysis = (self._analyze_viral_content(features), self._analyze_conversation_flow(features))
+                text_analyses[transcription] = analysis
+            viral_analysis, conversation_flow = analysis
             emotional_intensity = viral_analysis['score']
             confidence = viral_analysis['confidence']
 
-            # Análisis de claridad del habla
-            duration = max(0.01, end - start)
-            speech_clarity = self._analyze_speech_clarity(transcription, duration)
-
-            # Análisis de flujo conversacional
-            conversation_flow = self._analyze_conversation_flow(transcription)
+            speech_clarity = float(speech_clarities[i])
+            keyword_density = float(keyword_densities[i])
 
-            # Keyword density (palabras por segundo)
-            keyword_density = len(transcription.split()) / duration if duration > 0 else 0.0
+            # Energía RMS normalizada del segmento de origen; sin medición el score usa los pesos sin
+            # energía y el candidato guarda 0.5
+            measured_energy = highlight.get("audio_energy")
+            audio_energy = 0.5 if measured_energy is None else float(measured_energy)
 
-            # Audio energy placeholder (puede estimarse via librosa si se dispone del audio)
-            audio_energy = 0.5
+            emotional_intensities[i] = emotional_intensity
+            conversation_flows[i] = conversation_flow
+            audio_energies[i] = np.nan if measured_energy is None else audio_energy
+            confidences[i] = confidence
 
-            # Crear candidato principal
+            # Crear candidato principal (el score final se calcula en bloque más abajo)
             candidate = ClipCandidate(
                 start=start,
                 end=end,
@@ -983,13 +1974,14 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 transcription=transcription,
                 confidence=confidence
             )
-
-            # Calcular score final avanzado
-            candidate.final_score = self._calculate_advanced_score(candidate)
             candidates.append(candidate)
+            candidate_sources.append(i)
+            candidate_base_scores.append(base_score)
+            candidate_starts.append(start)
+            candidate_ends.append(end)
 
             # Generar variantes: usar la heurística de duration y añadir muchas variaciones deterministas
-            base_target = self._compute_candidate_duration(candidate)
+            base_target = self._compute_candidate_duration(candidate, word_count=features.word_count)
             # Variantes amplias para producir más clips: desde muy compactas hasta extendidas
             variant_factors = [0.45, 0.7, 0.85, 1.0, 1.25, 1.6, 2.0]
             seen_variants = set()
@@ -1022,9 +2014,33 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                         transcription=transcription,
                         confidence=confidence
                     )
-                    var_candidate.final_score = self._calculate_advanced_score(var_candidate)
                     candidates.append(var_candidate)
-        
+                    candidate_sources.append(i)
+                    candidate_base_scores.append(var_candidate.base_score)
+                    candidate_starts.append(s)
+                    candidate_ends.append(e)
+        
+        # Score final avanzado de todos los candidatos (principales y variantes) en una sola pasada
+        if candidates:
+            optimal_min, optimal_max = self.optimal_clip_duration
+            sources = np.array(candidate_sources, dtype=np.intp)
+            factors = np.column_stack((
+                np.array(candidate_base_scores, dtype=np.float64),
+                emotional_intensities[sources],
+                speech_clarities[sources],
+                conversation_flows[sources],
+                audio_energies[sources]
+            ))
+            final_scores = _advanced_scores(
+                factors,
+                np.array(candidate_ends, dtype=np.float64) - np.array(candidate_starts, dtype=np.float64),
+                float(optimal_min),
+                float(optimal_max),
+                confidences[sources]
+            )
+            for candidate, final_score in zip(candidates, final_scores.tolist()):
+                candidate.final_score = final_score
+
         # Aplicar algoritmo de selección óptima
         optimal_clips = self._select_optimal_clips(candidates)
         
@@ -1069,18 +2085,20 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         # Si no hay candidatos que cumplan el umbral, relajar progresivamente (más pasos)
         if not viral_candidates:
             relaxed_thresholds = [0.55, 0.5, 0.45, 0.4, 0.35, 0.3]
+            # El primer umbral con algún candidato es el primero que no supera el mejor score: se filtra una sola vez
+            best_score = max(c.final_score for c in candidates)
             for threshold in relaxed_thresholds:
-                viral_candidates = [c for c in candidates if c.final_score >= threshold]
-                if viral_candidates:
+                if best_score >= threshold:
+                    viral_candidates = [c for c in candidates if c.final_score >= threshold]
                     logger.info(f"Se encontraron candidatos con threshold relajado: {threshold} -> {len(viral_candidates)}")
                     break
 
         # Si aún no hay ninguno, tomar los N mejores (N mayor para generar más clips)
         if not viral_candidates:
-            candidates_sorted = sorted(candidates, key=lambda x: x.final_score, reverse=True)
             max_fallback_clips = min(max(5, int(len(candidates) * 0.5)), len(candidates))
             logger.info(f"Sin candidatos virales, tomando los {max_fallback_clips} mejores clips disponibles (fallback)")
-            return candidates_sorted[:max_fallback_clips]
+            # Selección parcial O(n log k): mismo resultado que ordenar todo y cortar
+            return heapq.nlargest(max_fallback_clips, candidates, key=lambda x: x.final_score)
         
         # Aplicar algoritmo de selección con restricciones temporales dinámicas
         n = len(viral_candidates)
@@ -1092,56 +2110,46 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         dynamic_limit = max(self.max_clips_per_video, min(200, n))
         max_clips_allowed = min(dynamic_limit, n)
 
-        # Crear matriz de compatibilidad temporal
-        compatible = [[False] * n for _ in range(n)]
-        for i in range(n):
-            for j in range(i + 1, n):
-                clip1, clip2 = viral_candidates[i], viral_candidates[j]
-                # Calcular solapamiento real
-                latest_start = max(clip1.start, clip2.start)
-                earliest_end = min(clip1.end, clip2.end)
-                overlap = max(0.0, earliest_end - latest_start)
-                # Solapamiento relativo sobre la duración mayor
-                max_duration = max(clip1.end - clip1.start, clip2.end - clip2.start, 1e-6)
-                overlap_ratio = overlap / max_duration
-                # Similitud textual
-                sim = self._text_similarity(getattr(clip1, 'transcription', ''), getattr(clip2, 'transcription', ''))
-                # Si son muy similares, requerir menos solapamiento permitido, si no, ser más permisivo
-                sim_threshold = 0.6
-                if sim >= sim_threshold:
-                    allowed_overlap = 0.35
-                else:
-                    allowed_overlap = 0.5
-                # Considerar compatibles si el overlap es pequeño y la separación minima se respeta
-                separation_ok = (clip2.start - clip1.end) >= self.min_clip_separation or (clip1.start - clip2.end) >= self.min_clip_separation
-                if overlap_ratio <= allowed_overlap or separation_ok:
-                    compatible[i][j] = compatible[j][i] = True
-                else:
-                    compatible[i][j] = compatible[j][i] = False
-        
+        # Caso frecuente con pocos candidatos: si ya están todos separados entre sí (vienen ordenados
+        # por inicio), tanto el greedy como la DP los aceptarían todos, así que se devuelven directamente
+        if n <= max_clips_allowed:
+            starts = np.fromiter((c.start for c in viral_candidates), dtype=np.float64, count=n)
+            ends = np.fromiter((c.end for c in viral_candidates), dtype=np.float64, count=n)
+            if (starts[1:] - np.maximum.accumulate(ends)[:-1] >= self.min_clip_separation).all():
+                logger.info(f"Clips seleccionados: {n} candidatos ya separados entre sí")
+                return viral_candidates
+
         # Selección greedy primero: priorizar incluir tantos clips virales como sea posible
         selected_clips = []
+        # Inicio/fin de los ya seleccionados en arrays: cada candidato se compara con todos de una vez
+        selected_starts = np.empty(max_clips_allowed, dtype=np.float64)
+        selected_ends = np.empty(max_clips_allowed, dtype=np.float64)
         # Ordenar por score desc para intentar tomar los momentos más fuertes primero
         for clip in sorted(viral_candidates, key=lambda x: x.final_score, reverse=True):
-            # Permitir solapamientos suaves y priorizar incluir variantes cercanas
-            overlaps_ratio = 0.0
-            for c in selected_clips:
-                overlap = max(0.0, min(c.end, clip.end) - max(c.start, clip.start))
-                norm = max(1e-6, min(c.end - c.start, clip.end - clip.start))
-                overlaps_ratio = max(overlaps_ratio, overlap / norm)
-
-            # Condiciones para aceptar: no solapamiento total, o clip de alta puntuación
-            too_much_overlap = overlaps_ratio > 0.9
-            separation_ok = all(abs(clip.start - c.end) >= self.min_clip_separation for c in selected_clips)
-
-            if not too_much_overlap and (separation_ok or clip.final_score > 0.55 or len(selected_clips) < 5):
+            m = len(selected_clips)
+            if m:
+                starts = selected_starts[:m]
+                ends = selected_ends[:m]
+                # Permitir solapamientos suaves y priorizar incluir variantes cercanas
+                overlap = np.maximum(0.0, np.minimum(ends, clip.end) - np.maximum(starts, clip.start))
+                norm = np.maximum(1e-6, np.minimum(ends - starts, clip.end - clip.start))
+                # Condiciones para aceptar: no solapamiento total, o clip de alta puntuación
+                too_much_overlap = bool((overlap / norm).max() > 0.9)
+                separation_ok = bool((np.abs(clip.start - ends) >= self.min_clip_separation).all())
+            else:
+                too_much_overlap = False
+                separation_ok = True
+
+            if not too_much_overlap and (separation_ok or clip.final_score > 0.55 or m < 5):
+                selected_starts[m] = clip.start
+                selected_ends[m] = clip.end
                 selected_clips.append(clip)
             if len(selected_clips) >= max_clips_allowed:
                 break
 
         # Si la selección greedy no devolvió suficientes clips y n>1, usar DP para obtener una alternativa
         if len(selected_clips) < max_clips_allowed and n > 1:
-            dp_selected = self._dp_optimal_selection(viral_candidates, compatible, max_clips_allowed)
+            dp_selected = self._weighted_interval_selection(viral_candidates, max_clips_allowed)
             dp_score = sum(c.final_score for c in dp_selected)
             greedy_score = sum(c.final_score for c in selected_clips)
             if dp_score > greedy_score:
@@ -1152,94 +2160,61 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         selected_clips.sort(key=lambda x: x.start)
         return selected_clips
 
-    def _dp_optimal_selection(self, candidates: List[ClipCandidate], compatible: List[List[bool]], max_clips: int) -> List[ClipCandidate]:
-        """Algoritmo de programación dinámica para selección óptima con límite dinámico"""
+    def _weighted_interval_selection(self, candidates: List[ClipCandidate], max_clips: int) -> List[ClipCandidate]:
+        """Weighted interval scheduling en O(n log n): OPT(i) = max(OPT(i-1), w_i + OPT(p_i)).
+
+        Con los candidatos ordenados por fin, el predecesor p_i es el último j que termina al menos
+        `min_clip_separation` antes de que empiece i. Esa compatibilidad es un orden de intervalos, así
+        que la recurrencia es exacta (también con el tope de clips); los predecesores se calculan a la
+        vez con np.searchsorted y la reconstrucción recorre `take` hacia atrás sin copiar listas.
+        """
         n = len(candidates)
         if n == 0:
             return []
-        
-        # Usar límite dinámico pero con flexibilidad
-        max_clips_dynamic = min(max_clips, n)
-        
-        # dp[i][k] = (score_máximo, clips_seleccionados) usando hasta el clip i con k clips
-        dp = [[(0.0, []) for _ in range(max_clips_dynamic + 1)] for _ in range(n)]
-
-        # Inicialización para el primer elemento
-        for k in range(max_clips_dynamic + 1):
-            if k == 1:
-                dp[0][k] = (candidates[0].final_score, [candidates[0]])
+        starts = np.fromiter((c.start for c in candidates), dtype=np.float64, count=n)
+        ends = np.fromiter((c.end for c in candidates), dtype=np.float64, count=n)
+        scores = np.fromiter((c.final_score for c in candidates), dtype=np.float64, count=n)
+
+        order = np.argsort(ends, kind='stable')
+        starts, ends, scores = starts[order], ends[order], scores[order]
+        predecessor = np.searchsorted(ends, starts - self.min_clip_separation, side='right') - 1
+        predecessor = np.minimum(predecessor, np.arange(n) - 1)
+        predecessor_list = predecessor.tolist()
+        order_list = order.tolist()
+
+        # La recurrencia corre en el núcleo compilado; la reconstrucción recorre listas de Python
+        dp, take_array = _wis_dp(scores, predecessor)
+        take = take_array.tolist()
+
+        selected = []
+        i = n - 1
+        while i >= 0:
+            if take[i]:
+                selected.append(candidates[order_list[i]])
+                i = predecessor_list[i]
             else:
-                dp[0][k] = (0.0, [])
-        
-        # Llenar tabla DP
-        for i in range(1, n):
-            current_candidate = candidates[i]
-            
-            for k in range(max_clips_dynamic + 1):
-                # Opción 1: No tomar el clip actual
-                dp[i][k] = dp[i-1][k]
-                
-                # Opción 2: Tomar el clip actual
-                if k > 0:
-                    # Tomar clip actual solo
-                    if k == 1:
-                        if current_candidate.final_score > dp[i][k][0]:
-                            dp[i][k] = (current_candidate.final_score, [current_candidate])
-                    else:
-                        # Buscar el mejor clip compatible anterior considerando diversidad textual
-                        best_score = 0.0
-                        best_combination = []
-
-                        for j in range(i):
-                            if compatible[j][i] and dp[j][k-1][0] > 0:
-                                prev_score, prev_list = dp[j][k-1]
-                                # Penalizar similitud entre current_candidate y cada clip en prev_list
-                                sim_penalty = 0.0
-                                unique_tokens = set()
-                                for pc in prev_list:
-                                    s = self._text_similarity(getattr(pc, 'transcription', ''), getattr(current_candidate, 'transcription', ''))
-                                    sim_penalty += s
-                                    unique_tokens.update([w.lower() for w in getattr(pc, 'transcription', '').split() if w.strip()])
-
-                                # Calcular diversity bonus proporcional a tokens únicos nuevos
-                                current_tokens = set([w.lower() for w in getattr(current_candidate, 'transcription', '').split() if w.strip()])
-                                new_tokens = current_tokens - unique_tokens
-                                diversity_bonus = min(0.2, len(new_tokens) / max(1, len(current_tokens))) if current_tokens else 0.0
-
-                                combined_score = prev_score + current_candidate.final_score - (sim_penalty * 0.15) + diversity_bonus
-                                if combined_score > best_score:
-                                    best_score = combined_score
-                                    # create a new list to avoid shared references
-                                    best_combination = list(prev_list) + [current_candidate]
-
-                        if best_score > dp[i][k][0]:
-                            dp[i][k] = (best_score, best_combination)
-        
-        # Encontrar la mejor solución
-        best_score = 0.0
-        best_clips = []
-        
-        for i in range(n):
-            for k in range(1, max_clips_dynamic + 1):
-                if dp[i][k][0] > best_score:
-                    best_score = dp[i][k][0]
-                    best_clips = dp[i][k][1]
-        
-        logger.info(f"Algoritmo DP seleccionó {len(best_clips)} clips con score total: {best_score:.3f}")
-        return best_clips
+                i -= 1
+        selected.reverse()
+
+        total = float(dp[n])
+        if len(selected) > max_clips:
+            # La solución libre excede el tope: repetir la recurrencia acotando el número de clips. Solo
+            # se guarda la decisión (bool) de cada celda y la lista se materializa una vez al final
+            dp_k, take_k = _wis_dp_bounded(scores, predecessor, max_clips)
+
+            selected = []
+            i, k = n - 1, max_clips
+            while i >= 0 and k > 0:
+                if take_k[i, k]:
+                    selected.append(candidates[order_list[i]])
+                    i, k = predecessor_list[i], k - 1
+                else:
+                    i -= 1
+            selected.reverse()
+            total = float(dp_k[n, max_clips])
+        logger.info(f"Selección por intervalos ponderados: {len(selected)} clips con score total: {total:.3f}")
+        return selected
 
-    def _text_similarity(self, a: str, b: str) -> float:
-        """Simple similitud Jaccard basada en tokens de palabras (0..1)."""
-        if not a or not b:
-            return 0.0
-        sa = set([w.strip('.,!?;:()"\'').lower() for w in a.split() if w.strip()])
-        sb = set([w.strip('.,!?;:()"\'').lower() for w in b.split() if w.strip()])
-        if not sa or not sb:
-            return 0.0
-        inter = sa.intersection(sb)
-        union = sa.union(sb)
-        return float(len(inter) / len(union))
-    
     def _validate_viral_potential(self, clips: List[Dict]) -> List[Dict]:
         """
         Validación flexible para asegurar que los clips tengan potencial viral.
@@ -1247,53 +2222,78 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         if not clips:
             return clips
         
-        viral_clips = []
-        for clip in clips:
-            score = clip.get("score", 0)
-            reason = clip.get("reason", "")
-            duration = clip["end"] - clip["start"]
-            
-            # Criterios de validación más flexibles
-            is_viral_worthy = (
-                score >= settings.viral_score_threshold and  # Score mínimo configurable
-                self.absolute_min_duration <= duration <= self.absolute_max_duration and  # Duración flexible
-                len(reason) > 5  # Razón descriptiva mínima
-            )
-            
-            if is_viral_worthy:
-                viral_clips.append(clip)
-                logger.info(f"Clip validado como viral: {clip['start']:.1f}s-{clip['end']:.1f}s "
-                           f"(duración: {duration:.1f}s, score: {score:.2f})")
-            else:
-                logger.info(f"Clip descartado en validación: {clip['start']:.1f}s-{clip['end']:.1f}s "
-                           f"(duración: {duration:.1f}s, score: {score:.2f}) - "
-                           f"Razones: score < {settings.viral_score_threshold}, "
-                           f"duración fuera de rango [{self.absolute_min_duration}-{self.absolute_max_duration}]")
+        threshold = settings.viral_score_threshold
+        min_duration = self.absolute_min_duration
+        max_duration = self.absolute_max_duration
+        count = len(clips)
+        starts = np.fromiter((clip["start"] for clip in clips), dtype=np.float64, count=count)
+        ends = np.fromiter((clip["end"] for clip in clips), dtype=np.float64, count=count)
+        scores = np.fromiter((clip.get("score", 0) for clip in clips), dtype=np.float64, count=count)
+        reason_lengths = np.fromiter((len(clip.get("reason", "")) for clip in clips), dtype=np.int64, count=count)
+        durations = ends - starts
+
+        # Criterios de validación más flexibles, evaluados para todos los clips con una máscara
+        is_viral_worthy = (
+            (scores >= threshold) &  # Score mínimo configurable
+            (durations >= min_duration) & (durations <= max_duration) &  # Duración flexible
+            (reason_lengths > 5)  # Razón descriptiva mínima
+        )
+        viral_clips = [clips[i] for i in np.flatnonzero(is_viral_worthy).tolist()]
+
+        if logger.isEnabledFor(logging.INFO):
+            for clip, worthy, duration, score in zip(clips, is_viral_worthy.tolist(), durations.tolist(), scores.tolist()):
+                if worthy:
+                    logger.info("Clip validado como viral: %.1fs-%.1fs (duración: %.1fs, score: %.2f)",
+                                clip['start'], clip['end'], duration, score)
+                else:
+                    logger.info("Clip descartado en validación: %.1fs-%.1fs (duración: %.1fs, score: %.2f) - "
+                                "Razones: score < %s, duración fuera de rango [%s-%s]",
+                                clip['start'], clip['end'], duration, score, threshold,
+                                min_duration, max_duration)
         
         logger.info(f"Validación completada: {len(viral_clips)} clips virales de {len(clips)} candidatos")
         return viral_clips
     
+    @staticmethod
+    def _highlight_bounds(highlights: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Inicio y fin de todos los highlights como arrays"""
+        count = len(highlights)
+        starts = np.fromiter((float(h.get("start", 0)) for h in highlights), dtype=np.float64, count=count)
+        ends = np.fromiter((float(h.get("end", 0)) for h in highlights), dtype=np.float64, count=count)
+        return starts, ends
+
+    def _clamp_clip_bounds(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Extiende los clips cortos hasta la duración mínima (a ambos lados, sin bajar de 0) y
+        recorta los largos a la máxima, vectorizado sobre todos los clips"""
+        durations = ends - starts
+        extension = np.where(durations < self.absolute_min_duration, (self.absolute_min_duration - durations) / 2, 0.0)
+        starts = np.maximum(0.0, starts - extension)
+        ends = np.minimum(ends + extension, starts + self.absolute_max_duration)
+        return starts, ends
+
     def _convert_to_clips_with_metadata(self, highlights: List[Dict], video_duration: float) -> List[Dict[str, Any]]:
         """Convierte highlights a clips válidos con metadatos completos y duración dinámica"""
         clips = []
-        
-        for highlight in highlights:
-            start = float(highlight.get("start", 0))
-            end = float(highlight.get("end", 0))
+        starts, ends = self._highlight_bounds(highlights)
+        
+        # Límites de duración leídos una vez fuera del bucle
+        min_duration = self.absolute_min_duration
+        max_duration = self.absolute_max_duration
+        # Validar que el clip tenga sentido (duración positiva) para todos a la vez
+        for i in np.flatnonzero(ends > starts).tolist():
+            highlight = highlights[i]
+            start = float(starts[i])
+            end = float(ends[i])
             score = highlight.get("score", 0.5)
             reason = highlight.get("reason", "Momento destacado identificado por IA")
             duration = end - start
             
-            # Validar que el clip tenga sentido
-            if duration <= 0:
-                continue
-            
             # Usar duración dinámica basada en el análisis de Deepseek
             optimal_duration = highlight.get("optimal_duration")
             if optimal_duration:
                 # Si Deepseek especifica una duración óptima, usarla
                 target_duration = float(optimal_duration)
-                logger.info(f"Usando duración óptima de Deepseek: {target_duration:.1f}s")
+                logger.info("Usando duración óptima de Deepseek: %.1fs", target_duration)
                 
                 # Ajustar tiempos manteniendo el centro del momento
                 center_time = (start + end) / 2
@@ -1313,7 +2313,7 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 duration = end - start
                 # Aplicar jitter determinista leve a la duración para diversidad entre clips
                 jitter = (self._deterministic_jitter(int(start*1000)) - 0.5) * 0.08  # +-8%
-                duration = max(self.absolute_min_duration, min(self.absolute_max_duration, duration * (1.0 + jitter)))
+                duration = max(min_duration, min(max_duration, duration * (1.0 + jitter)))
                 # Recalcular start/end manteniendo el centro
                 start = max(0, center_time - duration / 2)
                 end = min(video_duration, start + duration)
@@ -1341,11 +2341,11 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 base_target = target_duration
                 variants = [0.85, 1.0, 1.25]
                 chosen_variant = variants[int(abs(hash((start, end))) % len(variants))]
-                target_duration = max(self.absolute_min_duration, min(self.absolute_max_duration, base_target * chosen_variant))
+                target_duration = max(min_duration, min(max_duration, base_target * chosen_variant))
                 start = max(0, center - target_duration / 2)
                 end = min(video_duration, center + target_duration / 2)
                 duration = end - start
-                logger.info(f"Clip ajustado dinámicamente: {start:.1f}s - {end:.1f}s (duración objetivo: {target_duration:.1f}s)")
+                logger.info("Clip ajustado dinámicamente: %.1fs - %.1fs (duración objetivo: %.1fs)", start, end, target_duration)
             
             clip_data = {
                 "start": start,
@@ -1357,24 +2357,28 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
             }
             clips.append(clip_data)
             
-            logger.info(f"Clip con metadatos dinámicos: {start:.2f}s - {end:.2f}s "
-                       f"(duración: {duration:.1f}s, score: {score:.2f})")
+            logger.info("Clip con metadatos dinámicos: %.2fs - %.2fs (duración: %.1fs, score: %.2f)",
+                        start, end, duration, score)
         
         return clips
 
     def _convert_to_clips(self, highlights: List[Dict]) -> List[Tuple[float, float]]:
         """Convierte highlights a clips válidos con duraciones apropiadas y dinámicas"""
         clips = []
-        
-        for highlight in highlights:
-            start = float(highlight.get("start", 0))
-            end = float(highlight.get("end", 0))
+        starts, ends = self._highlight_bounds(highlights)
+        # Ajuste a los límites absolutos de duración calculado para todos los clips en una pasada
+        clamped_starts, clamped_ends = self._clamp_clip_bounds(starts, ends)
+        
+        # Límites de duración leídos una vez fuera del bucle
+        min_duration = self.absolute_min_duration
+        max_duration = self.absolute_max_duration
+        # Validar que el clip tenga sentido (duración positiva) para todos a la vez
+        for i in np.flatnonzero(ends > starts).tolist():
+            highlight = highlights[i]
+            start = float(starts[i])
+            end = float(ends[i])
             duration = end - start
             
-            # Validar que el clip tenga sentido
-            if duration <= 0:
-                continue
-            
             # Usar duración dinámica basada en análisis de Deepseek
             optimal_duration = highlight.get("optimal_duration")
             if optimal_duration:
@@ -1386,23 +2390,15 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 duration = end - start
                 # Añadir pequeña variación determinista por clip
                 jitter = (self._deterministic_jitter(int(start*1000)) - 0.5) * 0.08
-                duration = max(self.absolute_min_duration, min(self.absolute_max_duration, duration * (1.0 + jitter)))
+                duration = max(min_duration, min(max_duration, duration * (1.0 + jitter)))
                 start = max(0, center_time - duration / 2)
                 end = min(end, start + duration)
-                logger.info(f"Aplicando duración óptima de Deepseek: {target_duration:.1f}s (ajustada a {duration:.1f}s)")
+                logger.info("Aplicando duración óptima de Deepseek: %.1fs (ajustada a %.1fs)", target_duration, duration)
             else:
-                # Ajustar duración si es necesario con límites absolutos
-                if duration < self.absolute_min_duration:
-                    # Extender el clip para alcanzar la duración mínima
-                    extension = (self.absolute_min_duration - duration) / 2
-                    start = max(0, start - extension)
-                    end = end + extension
-                    duration = end - start
-                
-                if duration > self.absolute_max_duration:
-                    # Acortar el clip a la duración máxima
-                    end = start + self.absolute_max_duration
-                    duration = self.absolute_max_duration
+                # Límites absolutos ya aplicados en bloque por _clamp_clip_bounds
+                start = float(clamped_starts[i])
+                end = float(clamped_ends[i])
+                duration = end - start
 
             # Generar una variante compacta y una extendida si el clip está dentro de un rango adecuado
             try:
@@ -1410,9 +2406,9 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 base_duration = duration
                 variants = []
                 # Compacta (gancho)
-                compact = max(self.absolute_min_duration, base_duration * 0.75)
+                compact = max(min_duration, base_duration * 0.75)
                 # Extendida (contexto)
-                extended = min(self.absolute_max_duration, base_duration * 1.4)
+                extended = min(max_duration, base_duration * 1.4)
                 # Añadir si son diferentes
                 if abs(compact - base_duration) / base_duration > 0.12:
                     variants.append((center_time - compact / 2, center_time + compact / 2))
@@ -1421,8 +2417,8 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 # Insertar variantes deterministas antes del clip principal para aumentar número de salidas
                 for vs, ve in variants:
                     vs_clamped = max(0, vs)
-                    ve_clamped = min(ve, ve if ve <= (vs + self.absolute_max_duration) else vs + self.absolute_max_duration)
-                    if ve_clamped - vs_clamped >= self.absolute_min_duration:
+                    ve_clamped = min(ve, ve if ve <= (vs + max_duration) else vs + max_duration)
+                    if ve_clamped - vs_clamped >= min_duration:
                         clips.append({
                             "start": vs_clamped,
                             "end": ve_clamped,
@@ -1439,8 +2435,8 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                 "reason": highlight.get("reason", "Momento destacado identificado por IA")
             })
             
-            logger.info(f"Clip identificado dinámico: {start:.2f}s - {end:.2f}s "
-                       f"(duración: {duration:.1f}s, score: {highlight.get('score', 0):.2f})")
+            logger.info("Clip identificado dinámico: %.2fs - %.2fs (duración: %.1fs, score: %.2f)",
+                        start, end, duration, highlight.get('score', 0))
         
         # Aplicar filtro de solapamiento
         filtered_highlights = self._filter_overlapping_clips(clips)
@@ -1448,11 +2444,15 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
         # Convertir a tuplas para mantener compatibilidad
         return [(clip["start"], clip["end"]) for clip in filtered_highlights]
     
-    async def _fallback_analysis_with_metadata(self, video_path: str) -> List[Dict[str, Any]]:
-        """Análisis de respaldo con metadatos cuando no está disponible la API"""
+    async def _fallback_analysis_with_metadata(self, video_path: str, duration: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Análisis de respaldo con metadatos cuando no está disponible la API.
+
+        Si el llamador ya conoce la duración del video la pasa en `duration` para no volver a ejecutar ffprobe.
+        """
         logger.info("Usando análisis de respaldo con metadatos (selección inteligente de segmentos)")
         
-        duration = await self._get_video_duration(video_path)
+        if duration is None:
+            duration = await self._get_video_duration(video_path)
         if duration <= 0:
             return []
         
@@ -1476,20 +2476,13 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
 
         min_segment_duration = self.optimal_clip_duration[0]
         max_segment_duration = self.optimal_clip_duration[1]
+        min_duration = self.absolute_min_duration
 
-        for i in range(total_clips):
-            # Posición relativa en el video (0..1)
-            segment_position = (i + 0.5) / total_clips
-
-            # Calcular duración objetivo usando helper inteligente
-            segment_duration = self._compute_backup_segment_duration(
-                position=segment_position,
-                index=i,
-                total=total_clips,
-                min_d=min_segment_duration,
-                max_d=max_segment_duration
-            )
+        # Posición relativa en el video (0..1) y duración objetivo de todos los clips de una vez
+        positions = (np.arange(total_clips) + 0.5) / total_clips
+        durations = self._compute_backup_segment_durations(positions, min_segment_duration, max_segment_duration)
 
+        for i, (segment_position, segment_duration) in enumerate(zip(positions.tolist(), durations.tolist())):
             # Centrar el clip en la posición calculada
             center = segment_position * duration
             start_time = max(0, center - segment_duration / 2)
@@ -1497,7 +2490,7 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
             # Ajustar start si el end tocó el final
             start_time = max(0, end_time - segment_duration)
 
-            if end_time - start_time >= self.absolute_min_duration:
+            if end_time - start_time >= min_duration:
                 actual_duration = end_time - start_time
                 segments.append({
                     "start": start_time,
@@ -1507,74 +2500,49 @@ NOTA CRÍTICA: NO te limites por números artificiales. Si encuentras 8 momentos
                     "duration": actual_duration
                 })
 
-                logger.info(f"Segmento de respaldo {i+1}: {start_time:.1f}s - {end_time:.1f}s (duración: {actual_duration:.1f}s)")
+                logger.info("Segmento de respaldo %d: %.1fs - %.1fs (duración: %.1fs)", i + 1, start_time, end_time, actual_duration)
         
         return segments
 
-    async def _fallback_analysis(self, video_path: str) -> List[Tuple[float, float]]:
-        """Análisis de respaldo cuando no está disponible la API"""
-        logger.info("Usando análisis de respaldo (selección inteligente de segmentos)")
-        
-        duration = await self._get_video_duration(video_path)
-        if duration <= 0:
-            return []
-        
-        segments = []
-        
-        if duration < self.absolute_min_duration:
-            return []
-        
-        if duration <= self.absolute_max_duration:
-            return [(0.0, duration)]
-        
-        clips_per_hour = 4
-        total_clips = min(self.max_clips_per_video, max(2, int(duration / 3600 * clips_per_hour)))
-
-        min_segment_duration = self.optimal_clip_duration[0]
-        max_segment_duration = self.optimal_clip_duration[1]
-
-        for i in range(total_clips):
-            segment_position = (i + 0.5) / total_clips
-
-            segment_duration = self._compute_backup_segment_duration(
-                position=segment_position,
-                index=i,
-                total=total_clips,
-                min_d=min_segment_duration,
-                max_d=max_segment_duration
-            )
-
-            center = segment_position * duration
-            start_time = max(0, center - segment_duration / 2)
-            end_time = min(duration, start_time + segment_duration)
-            start_time = max(0, end_time - segment_duration)
-
-            if end_time - start_time >= self.absolute_min_duration:
-                segments.append((start_time, end_time))
-                logger.info(f"Segmento de respaldo {i+1}: {start_time:.1f}s - {end_time:.1f}s "
-                           f"(duración: {end_time - start_time:.1f}s)")
-
-        
-        return segments
+    async def _fallback_analysis(self, video_path: str, duration: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Análisis de respaldo cuando no está disponible la API (solo límites de los segmentos)"""
+        segments = await self._fallback_analysis_with_metadata(video_path, duration)
+        return [(segment["start"], segment["end"]) for segment in segments]
     
     async def _get_video_duration(self, video_path: str) -> float:
-        """Obtiene la duración del video usando FFprobe"""
+        """Obtiene la duración del video usando FFprobe (memoizada por ruta real, tamaño y fecha de modificación)"""
+        try:
+            stat = os.stat(video_path)
+            cache_key = (os.path.realpath(video_path), stat.st_size, stat.st_mtime)
+        except OSError:
+            cache_key = None
+        if cache_key in self._duration_cache:
+            return self._duration_cache[cache_key]
+
         try:
-            cmd = [
-                'ffprobe', 
+            proc = await asyncio.create_subprocess_exec(
+                'ffprobe',
                 '-v', 'quiet',
                 '-show_entries', 'format=duration',
                 '-of', 'csv=p=0',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+                video_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
             
-            if result.returncode == 0:
-                duration = float(result.stdout.strip())
+            if proc.returncode == 0:
+                duration = float(stdout.decode().strip())
+                if cache_key is not None:
+                    self._duration_cache[cache_key] = duration
                 return duration
             else:
-                logger.error(f"FFprobe error: {result.stderr}")
+                logger.error(f"FFprobe error: {stderr.decode(errors='ignore')}")
                 return 0.0
                 
         except Exception as e:
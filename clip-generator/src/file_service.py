@@ -4,6 +4,7 @@ import logging
 import aiohttp
 import aiofiles
 import shutil
+from typing import Optional
 from urllib.parse import urlparse
 from config import settings
 
@@ -16,6 +17,23 @@ class FileDownloadService:
         os.makedirs(self.temp_clips_dir, exist_ok=True)
         # Diccionario para rastrear clips temporales
         self.temp_clips = {}
+        # Sesión HTTP reutilizada entre descargas (se crea con el primer uso)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Sesión compartida: conserva conexiones TLS y DNS abiertas hacia los mismos orígenes entre videos"""
+        if self._session is None or self._session.closed:
+            # SIN timeout total para videos largos (solo se acota el establecimiento de la conexión)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=600, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30)
+            )
+        return self._session
+
+    async def close(self):
+        """Cierra la sesión HTTP compartida"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
         
     async def download_video(self, video_url: str) -> str:
         """
@@ -44,67 +62,67 @@ class FileDownloadService:
 
             logger.info(f"Descargando video desde: {video_url}")
 
-            # ClientSession SIN timeout para videos largos
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url) as response:
-                    if response.status == 200:
-                        # Obtener información del archivo
-                        content_length = response.headers.get('Content-Length')
-                        total_size_mb = None
+            # Sesión compartida SIN timeout para videos largos
+            session = self._get_session()
+            async with session.get(video_url) as response:
+                if response.status == 200:
+                    # Obtener información del archivo
+                    content_length = response.headers.get('Content-Length')
+                    total_size_mb = None
+                    
+                    if content_length:
+                        total_size = int(content_length)
+                        total_size_mb = total_size / (1024 * 1024)
                         
-                        if content_length:
-                            total_size = int(content_length)
-                            total_size_mb = total_size / (1024 * 1024)
-                            
-                            # Verificar tamaño máximo permitido
-                            if total_size_mb > settings.max_video_size_mb:
-                                raise Exception(f"Video demasiado grande: {total_size_mb:.1f}MB (máximo permitido: {settings.max_video_size_mb}MB)")
-                            
-                            logger.info(f"Iniciando descarga de video: {total_size_mb:.1f}MB ({total_size:,} bytes)")
-                        else:
-                            logger.info("Iniciando descarga de video (tamaño desconocido)")
-
-                        # Descarga con método robusto y seguimiento detallado de progreso
-                        downloaded_bytes = 0
-                        last_log_mb = 0
-                        chunk_size = settings.download_chunk_size
+                        # Verificar tamaño máximo permitido
+                        if total_size_mb > settings.max_video_size_mb:
+                            raise Exception(f"Video demasiado grande: {total_size_mb:.1f}MB (máximo permitido: {settings.max_video_size_mb}MB)")
                         
-                        logger.info(f"Usando chunks de {chunk_size / 1024 / 1024:.1f}MB para optimizar la descarga")
-                        
-                        # Usar método síncrono más robusto para archivos grandes
-                        with open(local_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(chunk_size):
-                                try:
-                                    # Escribir chunk de forma síncrona (más estable para archivos grandes)
-                                    f.write(chunk)
-                                    f.flush()  # Forzar escritura al disco
-                                    downloaded_bytes += len(chunk)
-                                    downloaded_mb = downloaded_bytes / (1024 * 1024)
+                        logger.info(f"Iniciando descarga de video: {total_size_mb:.1f}MB ({total_size:,} bytes)")
+                    else:
+                        logger.info("Iniciando descarga de video (tamaño desconocido)")
+
+                    # Descarga con método robusto y seguimiento detallado de progreso
+                    downloaded_bytes = 0
+                    last_log_mb = 0
+                    chunk_size = settings.download_chunk_size
+                    
+                    logger.info(f"Usando chunks de {chunk_size / 1024 / 1024:.1f}MB para optimizar la descarga")
+                    
+                    # Usar método síncrono más robusto para archivos grandes
+                    with open(local_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            try:
+                                # Escribir chunk de forma síncrona (más estable para archivos grandes)
+                                f.write(chunk)
+                                f.flush()  # Forzar escritura al disco
+                                downloaded_bytes += len(chunk)
+                                downloaded_mb = downloaded_bytes / (1024 * 1024)
+                                
+                                # Log de progreso cada N MB
+                                if downloaded_mb - last_log_mb >= settings.progress_log_interval:
+                                    if total_size_mb:
+                                        progress_pct = (downloaded_bytes / total_size) * 100
+                                        logger.info(f"Progreso descarga: {downloaded_mb:.1f}MB / {total_size_mb:.1f}MB ({progress_pct:.1f}%)")
+                                    else:
+                                        logger.info(f"Descargado: {downloaded_mb:.1f}MB...")
+                                    last_log_mb = downloaded_mb
                                     
-                                    # Log de progreso cada N MB
-                                    if downloaded_mb - last_log_mb >= settings.progress_log_interval:
-                                        if total_size_mb:
-                                            progress_pct = (downloaded_bytes / total_size) * 100
-                                            logger.info(f"Progreso descarga: {downloaded_mb:.1f}MB / {total_size_mb:.1f}MB ({progress_pct:.1f}%)")
-                                        else:
-                                            logger.info(f"Descargado: {downloaded_mb:.1f}MB...")
-                                        last_log_mb = downloaded_mb
-                                        
-                                except IOError as io_err:
-                                    logger.error(f"Error de E/O escribiendo chunk en {downloaded_mb:.1f}MB: {io_err}")
-                                    raise Exception(f"Error escribiendo archivo en {downloaded_mb:.1f}MB: {str(io_err)}")
+                            except IOError as io_err:
+                                logger.error(f"Error de E/O escribiendo chunk en {downloaded_mb:.1f}MB: {io_err}")
+                                raise Exception(f"Error escribiendo archivo en {downloaded_mb:.1f}MB: {str(io_err)}")
 
-                        # Verificar descarga completa
-                        final_size = os.path.getsize(local_path)
-                        final_size_mb = final_size / (1024 * 1024)
-                        
-                        if total_size_mb and abs(final_size_mb - total_size_mb) > 1:  # Tolerancia de 1MB
-                            logger.warning(f"Posible descarga incompleta: esperado {total_size_mb:.1f}MB, obtenido {final_size_mb:.1f}MB")
-                        
-                        logger.info(f"✅ Video descargado correctamente: {final_size_mb:.1f}MB en {local_path}")
-                        return local_path
-                    else:
-                        raise Exception(f"HTTP {response.status}: Falla al descargar video desde {video_url}")
+                    # Verificar descarga completa
+                    final_size = os.path.getsize(local_path)
+                    final_size_mb = final_size / (1024 * 1024)
+                    
+                    if total_size_mb and abs(final_size_mb - total_size_mb) > 1:  # Tolerancia de 1MB
+                        logger.warning(f"Posible descarga incompleta: esperado {total_size_mb:.1f}MB, obtenido {final_size_mb:.1f}MB")
+                    
+                    logger.info(f"✅ Video descargado correctamente: {final_size_mb:.1f}MB en {local_path}")
+                    return local_path
+                else:
+                    raise Exception(f"HTTP {response.status}: Falla al descargar video desde {video_url}")
 
         except aiohttp.ClientError as e:
             logger.error(f"Error de conexión HTTP: {e}")
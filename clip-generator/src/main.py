@@ -5,7 +5,7 @@ import logging
 import uvicorn
 import os
 from config import settings
-from routes import router
+from routes import router, service
 
 # Configuración de logging
 logging.basicConfig(
@@ -38,6 +38,11 @@ app.include_router(router, prefix="/api/v1")
 # if os.path.exists(settings.clips_output_dir):
 #     app.mount("/clips/raw", StaticFiles(directory=settings.clips_output_dir), name="clips")
 
+@app.on_event("shutdown")
+async def shutdown():
+    # Cerrar la sesión HTTP compartida con OpenRouter y los pools de transcripción
+    await service.close()
+
 @app.get("/")
 async def root():
     return {"message": "Servicio de Generación de Clips", "version": "1.0.0"}
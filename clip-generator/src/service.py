@@ -14,6 +14,11 @@ class ClipGeneratorService:
         self.file_service = FileDownloadService()
         self.video_processor = VideoProcessor()
     
+    async def close(self):
+        """Cierra los recursos compartidos al apagar el servicio"""
+        await self.video_processor.close()
+        await self.file_service.close()
+
     async def generate_clips(self, request: VideoRequest) -> Tuple[List[ClipMetadata], str, float]:
         """Genera clips a partir de un video analizando todo el contenido con IA."""
         
@@ -2,9 +2,9 @@ import os
 import uuid
 import logging
 import ffmpeg
-import subprocess
-import json
-from typing import List, Tuple, Dict
+import asyncio
+import numpy as np
+from typing import List, Tuple, Dict, Optional
 from config import settings
 from deepseek_analyzer import DeepseekVideoAnalyzer
 
@@ -17,6 +17,10 @@ class VideoProcessor:
         self.last_analysis_method = "unknown"
         os.makedirs(self.temp_dir, exist_ok=True)
     
+    async def close(self):
+        """Libera los recursos compartidos del analizador (sesión HTTP, pools)"""
+        await self.deepseek_analyzer.close()
+
     async def detect_highlights_with_metadata(self, video_path: str) -> List[Dict]:
         """
         Detecta los momentos destacados usando Deepseek AI y retorna metadatos completos
@@ -43,8 +47,9 @@ class VideoProcessor:
                     self.last_analysis_method = "deepseek_ai"
                     logger.info(f"Deepseek analysis completado: {len(highlights_data)} highlights con metadatos")
                     for i, highlight in enumerate(highlights_data):
-                        logger.info(f"  Highlight {i+1}: {highlight['start']:.2f}s - {highlight['end']:.2f}s "
-                                   f"(score: {highlight.get('score', 0):.2f}, reason: {highlight.get('reason', 'N/A')[:50]}...)")
+                        logger.info("  Highlight %d: %.2fs - %.2fs (score: %.2f, reason: %s...)",
+                                    i + 1, highlight['start'], highlight['end'], highlight.get('score', 0),
+                                    highlight.get('reason', 'N/A')[:50])
                     return highlights_data
                 else:
                     logger.warning("Deepseek no retornó datos, usando análisis de respaldo")
@@ -72,48 +77,39 @@ class VideoProcessor:
         return self.last_analysis_method
     
     async def _get_video_duration(self, video_path: str) -> float:
-        """Obtener la duración del video usando FFprobe"""
+        """Obtener la duración del video (ffprobe asíncrono memoizado en el analizador compartido)"""
+        return await self.deepseek_analyzer._get_video_duration(video_path)
+
+    async def _run_ffprobe(self, args: List[str], video_path: str, timeout: float = 30) -> Optional[str]:
+        """Ejecuta ffprobe sin bloquear el event loop; devuelve stdout o None si falla"""
+        proc = await asyncio.create_subprocess_exec(
+            'ffprobe', '-v', 'quiet', *args, video_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
         try:
-            cmd = [
-                'ffprobe', 
-                '-v', 'quiet',
-                '-show_entries', 'format=duration',
-                '-of', 'csv=p=0',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                duration = float(result.stdout.strip())
-                return duration
-            else:
-                logger.error(f"FFprobe error: {result.stderr}")
-                return 0.0
-                
-        except Exception as e:
-            logger.error(f"Error obteniendo la duración del video: {e}")
-            return 0.0
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            logger.error(f"FFprobe error: {stderr.decode(errors='ignore')}")
+            return None
+        return stdout.decode().strip()
 
     async def _get_video_dimensions(self, video_path: str) -> Tuple[int, int]:
         """Obtener el ancho y alto del video usando FFprobe"""
         try:
-            cmd = [
-                'ffprobe',
-                '-v', 'quiet',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height',
-                '-of', 'csv=s=x:p=0',
+            output = await self._run_ffprobe(
+                ['-select_streams', 'v:0', '-show_entries', 'stream=width,height', '-of', 'csv=s=x:p=0'],
                 video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                width, height = map(int, result.stdout.strip().split('x'))
+            )
+            if output is not None:
+                width, height = map(int, output.split('x'))
                 return width, height
             else:
-                logger.error(f"FFprobe error obteniendo dimensiones: {result.stderr}")
+                logger.error("FFprobe error obteniendo dimensiones")
                 return 1920, 1080  
                 
         except Exception as e:
@@ -123,18 +119,12 @@ class VideoProcessor:
     async def _check_audio_stream(self, video_path: str) -> bool:
         """Checkar si el video tiene pista de audio"""
         try:
-            cmd = [
-                'ffprobe',
-                '-v', 'quiet',
-                '-select_streams', 'a:0',
-                '-show_entries', 'stream=codec_type',
-                '-of', 'csv=p=0',
+            output = await self._run_ffprobe(
+                ['-select_streams', 'a:0', '-show_entries', 'stream=codec_type', '-of', 'csv=p=0'],
                 video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            )
             
-            has_audio = result.returncode == 0 and 'audio' in result.stdout.strip()
+            has_audio = output is not None and 'audio' in output
             logger.info(f"Video tiene audio: {has_audio}")
             return has_audio
                 
@@ -142,6 +132,18 @@ class VideoProcessor:
             logger.error(f"Error obteniendo la pista de audio: {e}")
             return True
 
+    def _simple_segment_bounds(self, duration: float, max_segments: int = 10) -> List[Tuple[float, float]]:
+        """Calcula los límites de los segmentos simples de forma vectorizada.
+
+        Ventanas de max_clip_duration con 10% de solapamiento para continuidad, descartando
+        las que no alcanzan min_clip_duration (máximo `max_segments`).
+        """
+        max_clip_duration = settings.max_clip_duration
+        starts = np.arange(0.0, duration, max_clip_duration * 0.9)
+        ends = np.minimum(starts + max_clip_duration, duration)
+        valid = (ends - starts) >= settings.min_clip_duration
+        return list(zip(starts[valid][:max_segments].tolist(), ends[valid][:max_segments].tolist()))
+
     def _create_simple_segments(self, duration: float) -> List[Tuple[float, float]]:
         """Crea segmentos simples basados en la duración del video"""
         
@@ -164,21 +166,10 @@ class VideoProcessor:
             return segments
 
         # Crear múltiples segmentos de max_clip_duration
-        current_time = 0.0
-        segment_count = 0
-        
-        while current_time < duration and segment_count < 10:  # Maximo 10 segmentos
-            end_time = min(current_time + max_clip_duration, duration)
-
-            # Solo agregar segmento si cumple con la duración mínima
-            if end_time - current_time >= min_clip_duration:
-                segments.append((current_time, end_time))
-                logger.info(f"Agregado segmento {segment_count + 1}: {current_time:.2f}s - {end_time:.2f}s "
-                           f"(duración: {end_time - current_time:.2f}s)")
-                segment_count += 1
-            
-            # Mover el tiempo actual, con un pequeño solapamiento para continuidad
-            current_time += max_clip_duration * 0.9  # 10% overlap
+        for segment_count, (start_time, end_time) in enumerate(self._simple_segment_bounds(duration)):
+            segments.append((start_time, end_time))
+            logger.info("Agregado segmento %d: %.2fs - %.2fs (duración: %.2fs)",
+                        segment_count + 1, start_time, end_time, end_time - start_time)
 
         logger.info(f"Se crearon {len(segments)} segmentos a partir del video de {duration:.2f}s")
         return segments
@@ -210,26 +201,15 @@ class VideoProcessor:
             return segments
 
         # Crear múltiples segmentos de max_clip_duration
-        current_time = 0.0
-        segment_count = 0
-        
-        while current_time < duration and segment_count < 10:  # Maximo 10 segmentos
-            end_time = min(current_time + max_clip_duration, duration)
-
-            # Solo agregar segmento si cumple con la duración mínima
-            if end_time - current_time >= min_clip_duration:
-                segments.append({
-                    "start": current_time,
-                    "end": end_time,
-                    "score": 0.5,  # Score básico para segmentos fallback
-                    "reason": f"Segmento {segment_count + 1} - análisis automático"
-                })
-                logger.info(f"Agregado segmento {segment_count + 1}: {current_time:.2f}s - {end_time:.2f}s "
-                           f"(duración: {end_time - current_time:.2f}s)")
-                segment_count += 1
-            
-            # Mover el tiempo actual, con un pequeño solapamiento para continuidad
-            current_time += max_clip_duration * 0.9  # 10% overlap
+        for segment_count, (start_time, end_time) in enumerate(self._simple_segment_bounds(duration)):
+            segments.append({
+                "start": start_time,
+                "end": end_time,
+                "score": 0.5,  # Score básico para segmentos fallback
+                "reason": f"Segmento {segment_count + 1} - análisis automático"
+            })
+            logger.info("Agregado segmento %d: %.2fs - %.2fs (duración: %.2fs)",
+                        segment_count + 1, start_time, end_time, end_time - start_time)
 
         logger.info(f"Se crearon {len(segments)} segmentos con metadatos a partir del video de {duration:.2f}s")
         return segments
@@ -0,0 +1,50 @@
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from deepseek_analyzer import ClipCandidate, DeepseekVideoAnalyzer  # noqa: E402
+
+
+def _candidate(start: float, end: float, score: float) -> ClipCandidate:
+    return ClipCandidate(
+        start=start, end=end, base_score=score, emotional_intensity=0.5, speech_clarity=0.5,
+        keyword_density=0.5, conversation_flow=0.5, audio_energy=0.5, final_score=score,
+        reason="", transcription="", confidence=0.5
+    )
+
+
+def _compatible(clips, separation: float) -> bool:
+    ordered = sorted(clips, key=lambda c: c.end)
+    return all(b.start - a.end >= separation for a, b in zip(ordered, ordered[1:]))
+
+
+def _brute_force(candidates, max_clips: int, separation: float) -> float:
+    best = 0.0
+    for k in range(1, max_clips + 1):
+        for subset in itertools.combinations(candidates, k):
+            if _compatible(subset, separation):
+                best = max(best, sum(c.final_score for c in subset))
+    return best
+
+
+def test_weighted_interval_selection_matches_brute_force():
+    analyzer = DeepseekVideoAnalyzer()
+    analyzer.min_clip_separation = 5.0
+    rng = random.Random(0)
+    for _ in range(400):
+        n = rng.randint(1, 8)
+        max_clips = rng.randint(1, 4)
+        candidates = []
+        for _ in range(n):
+            start = float(rng.randint(0, 60))
+            candidates.append(_candidate(start, start + rng.randint(5, 30), round(rng.uniform(0.1, 1.0), 2)))
+
+        selected = analyzer._weighted_interval_selection(list(candidates), max_clips)
+
+        assert len(selected) <= max_clips
+        assert _compatible(selected, analyzer.min_clip_separation)
+        total = sum(c.final_score for c in selected)
+        assert abs(total - _brute_force(candidates, max_clips, analyzer.min_clip_separation)) < 1e-9